@@ -32,7 +32,8 @@ function initializeRealTimeUpdates() {
 }
 
 function updateDashboardStats() {
-    fetch('/api/dashboard_stats')
+    // no-cache revalidates with the stored ETag, so unchanged stats come back as an empty 304
+    fetch('/api/dashboard_stats', { cache: 'no-cache' })
         .then(response => response.json())
         .then(data => {
             updateStatCards(data);
@@ -232,14 +233,52 @@ function setupProgressTracking() {
     });
 }
 
+// Background jobs report these statuses once they stop running
+function isFinishedStatus(status) {
+    return ['completed', 'completed_with_errors', 'failed', 'cancelled'].includes(status);
+}
+
 function trackBatchProgress(batchId, element) {
+    // Prefer the server-sent progress stream, which only sends changes
+    if (window.EventSource) {
+        const source = new EventSource(`/api/upload_progress/${batchId}/stream`);
+        let received = false;
+        
+        source.addEventListener('progress', event => {
+            received = true;
+            const data = JSON.parse(event.data);
+            updateProgressElement(element, data);
+            
+            if (isFinishedStatus(data.status)) {
+                source.close();
+                handleProgressComplete(element, data);
+            }
+        });
+        
+        source.addEventListener('missing', () => source.close());
+        
+        source.onerror = () => {
+            // Once connected the browser reconnects by itself; fall back to
+            // polling only if the stream is not available at all
+            if (!received) {
+                source.close();
+                pollBatchProgress(batchId, element);
+            }
+        };
+        return;
+    }
+    
+    pollBatchProgress(batchId, element);
+}
+
+function pollBatchProgress(batchId, element) {
     const interval = setInterval(() => {
         fetch(`/api/upload_progress/${batchId}`)
             .then(response => response.json())
             .then(data => {
                 updateProgressElement(element, data);
                 
-                if (data.status === 'completed' || data.status === 'failed') {
+                if (isFinishedStatus(data.status)) {
                     clearInterval(interval);
                     handleProgressComplete(element, data);
                 }
@@ -282,50 +321,24 @@ function handleProgressComplete(element, data) {
 }
 
 // Export functionality
-function exportDashboardReport() {
-    const reportData = gatherReportData();
-    const csvContent = generateCSVReport(reportData);
-    downloadCSV(csvContent, 'dashboard-report.csv');
-}
-
-function gatherReportData() {
-    // Gather all dashboard data for export
-    const stats = {
-        timestamp: new Date().toISOString(),
-        total_students: getStatValue('Total Students'),
-        total_certificates: getStatValue('Certificates Generated'),
-        sent_certificates: getStatValue('Certificates Sent'),
-        success_rate: getStatValue('Success Rate')
-    };
-    
-    return stats;
-}
-
-function getStatValue(label) {
-    const cards = document.querySelectorAll('.stat-card');
-    for (let card of cards) {
-        const cardLabel = card.querySelector('.small').textContent;
-        if (cardLabel.includes(label)) {
-            return card.querySelector('.h4').textContent;
-        }
-    }
-    return '0';
-}
+// The server streams the export from the database (utils/exports.py), so
+// the browser never holds the whole dataset
+const EXPORT_FILTERS = ['status', 'college', 'branch', 'internship', 'search'];
 
-function generateCSVReport(data) {
-    const headers = Object.keys(data).join(',');
-    const values = Object.values(data).join(',');
-    return `${headers}\n${values}`;
+function exportDashboardReport(event) {
+    const format = (event && event.currentTarget && event.currentTarget.dataset.format) || 'csv';
+    window.location.href = exportUrl(format);
 }
 
-function downloadCSV(content, filename) {
-    const blob = new Blob([content], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = filename;
-    a.click();
-    window.URL.revokeObjectURL(url);
+function exportUrl(format) {
+    // Carry over the listing filters the page was opened with
+    const current = new URLSearchParams(window.location.search);
+    const params = new URLSearchParams();
+    EXPORT_FILTERS.forEach(name => {
+        if (current.get(name)) params.set(name, current.get(name));
+    });
+    const query = params.toString();
+    return `/api/export/${format}` + (query ? `?${query}` : '');
 }
 
 // Notification system
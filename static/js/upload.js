@@ -268,14 +268,52 @@ function startProgressSimulation() {
     }, 500);
 }
 
+// Background jobs report these statuses once they stop running
+function isFinishedStatus(status) {
+    return ['completed', 'completed_with_errors', 'failed', 'cancelled'].includes(status);
+}
+
 function trackUploadProgress(batchId) {
+    // Prefer the server-sent progress stream, which only sends changes
+    if (window.EventSource) {
+        const source = new EventSource(`/api/upload_progress/${batchId}/stream`);
+        let received = false;
+        
+        source.addEventListener('progress', event => {
+            received = true;
+            const data = JSON.parse(event.data);
+            updateProgress(data.progress_percentage, getProgressMessage(data));
+            
+            if (isFinishedStatus(data.status)) {
+                source.close();
+                handleUploadComplete(data);
+            }
+        });
+        
+        source.addEventListener('missing', () => source.close());
+        
+        source.onerror = () => {
+            // Once connected the browser reconnects by itself; fall back to
+            // polling only if the stream is not available at all
+            if (!received) {
+                source.close();
+                pollUploadProgress(batchId);
+            }
+        };
+        return;
+    }
+    
+    pollUploadProgress(batchId);
+}
+
+function pollUploadProgress(batchId) {
     const interval = setInterval(() => {
         fetch(`/api/upload_progress/${batchId}`)
             .then(response => response.json())
             .then(data => {
                 updateProgress(data.progress_percentage, getProgressMessage(data));
                 
-                if (data.status === 'completed' || data.status === 'failed') {
+                if (isFinishedStatus(data.status)) {
                     clearInterval(interval);
                     handleUploadComplete(data);
                 }
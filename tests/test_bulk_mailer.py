@@ -0,0 +1,118 @@
+import asyncio
+import time
+import socket
+import threading
+
+import pytest
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+
+from app import app
+from utils.bulk_mailer import BulkMailer, StreamedMessage
+
+
+class RecordingHandler:
+    """aiosmtpd handler keeping every message it accepts"""
+
+    def __init__(self, reply='250 OK', drop_after_data=False):
+        self.reply = reply
+        self.drop_after_data = drop_after_data
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        if self.drop_after_data:
+            # Close the session once the reply is out, as an idle timeout would
+            asyncio.get_running_loop().call_later(0.05, server.transport.close)
+        return self.reply
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    def start(handler):
+        controller = Controller(handler, hostname='localhost', port=_free_port())
+        controller.start()
+        started.append(controller)
+        state = app.extensions['mail']
+        monkeypatch.setattr(state, 'server', 'localhost')
+        monkeypatch.setattr(state, 'port', controller.port)
+        monkeypatch.setattr(state, 'use_tls', False)
+        monkeypatch.setattr(state, 'use_ssl', False)
+        monkeypatch.setattr(state, 'username', None)
+        monkeypatch.setattr(state, 'password', None)
+        monkeypatch.setattr(state, 'suppress', False)
+        return handler
+
+    started = []
+    yield start
+    for controller in started:
+        controller.stop()
+
+
+def _message(recipient):
+    return lambda: Message(subject='Certificate', sender='noreply@example.com',
+                           recipients=[recipient], body='Your certificate is attached.')
+
+
+def test_send_all_delivers_every_message(smtp_server, tmp_path):
+    handler = smtp_server(RecordingHandler())
+    streamed_path = tmp_path / 'streamed.eml'
+    streamed_path.write_bytes(b'Subject: Streamed\r\n\r\n.leading dot\r\nbody\r\n')
+    tasks = [(i, f'student{i}@example.com', _message(f'student{i}@example.com')) for i in range(5)]
+    tasks.append((5, 'big@example.com',
+                  lambda: StreamedMessage('noreply@example.com', ['big@example.com'], str(streamed_path))))
+
+    results = BulkMailer(workers=2, rate_per_minute=0).send_all(tasks)
+
+    assert sorted(result['key'] for result in results if result['success']) == list(range(6))
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == sorted(task[1] for task in tasks)
+    streamed = next(envelope for envelope in handler.messages if envelope.rcpt_tos == ['big@example.com'])
+    assert b'\r\n.leading dot\r\n' in streamed.original_content
+
+
+def test_dropped_session_is_reopened_before_the_next_message(smtp_server):
+    handler = smtp_server(RecordingHandler(drop_after_data=True))
+    tasks = [(i, f'student{i}@example.com', _message(f'student{i}@example.com')) for i in range(3)]
+
+    results = BulkMailer(workers=1, rate_per_minute=0).send_all(_spaced(tasks))
+
+    assert all(result['success'] for result in results)
+    assert len(handler.messages) == 3
+
+
+def test_rejected_data_is_reported_and_not_sent_again(smtp_server):
+    handler = smtp_server(RecordingHandler(reply='554 Message rejected'))
+
+    results = BulkMailer(workers=1, rate_per_minute=0).send_all(
+        [(1, 'student@example.com', _message('student@example.com'))]
+    )
+
+    assert not results[0]['success']
+    assert '554' in results[0]['error']
+    assert len(handler.messages) == 1
+
+
+def test_workers_stop_when_the_task_iterator_raises(smtp_server):
+    smtp_server(RecordingHandler())
+
+    def tasks():
+        yield 1, 'student@example.com', _message('student@example.com')
+        raise RuntimeError('lost the database cursor')
+
+    with pytest.raises(RuntimeError):
+        BulkMailer(workers=2, rate_per_minute=0).send_all(tasks())
+
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('bulk-mailer-')]
+
+
+def _spaced(tasks, delay=0.2):
+    """Yield tasks with a pause between them, so the server drops the session in between"""
+    for task in tasks:
+        yield task
+        time.sleep(delay)
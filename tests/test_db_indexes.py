@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+from utils.db_indexes import INDEXES, migrate, check_query_plans, hot_queries
+
+
+@pytest.fixture
+def index_db(tmp_path):
+    """App context on a fresh SQLite database whose tables have none of the indexes yet"""
+    index_app = Flask(__name__)
+    index_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'indexes.db'}"
+    db.init_app(index_app)
+    with index_app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            for index in INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        yield
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_migrate_creates_every_index(index_db):
+    assert sorted(migrate()) == sorted(index.name for index in INDEXES)
+    assert migrate() == []
+
+
+def test_every_hot_query_uses_its_index(index_db):
+    migrate()
+
+    results = check_query_plans()
+
+    assert len(results) == len(hot_queries()) == 12
+    for result in results:
+        assert result['uses_index'], f"{result['name']}: {'; '.join(result['plan'])}"
@@ -0,0 +1,62 @@
+from utils.metrics import Metrics
+
+
+def _value(rendered, name):
+    for line in rendered.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split(' ')[1])
+    raise AssertionError(f"{name} not in output")
+
+
+def test_render_counts_observations_into_cumulative_buckets():
+    metrics = Metrics(buckets=(0.1, 1, 10))
+    metrics.observe('render', 0.05)
+    metrics.observe('render', 0.5)
+    metrics.observe('render', 5)
+
+    rendered = metrics.render()
+
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="render",le="0.1"}') == 1
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="render",le="1"}') == 2
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="render",le="10"}') == 3
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="render",le="+Inf"}') == 3
+    assert _value(rendered, 'certgen_stage_duration_seconds_sum{stage="render"}') == 5.55
+    assert _value(rendered, 'certgen_stage_duration_seconds_count{stage="render"}') == 3
+
+
+def test_render_keeps_observations_over_the_last_bucket_out_of_the_sum():
+    metrics = Metrics()
+    metrics.observe('smtp_send', 40)
+    metrics.observe('smtp_send', 0.5)
+
+    rendered = metrics.render()
+
+    assert _value(rendered, 'certgen_stage_duration_seconds_sum{stage="smtp_send"}') == 40.5
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="smtp_send",le="30"}') == 1
+    assert _value(rendered, 'certgen_stage_duration_seconds_bucket{stage="smtp_send",le="+Inf"}') == 2
+    assert _value(rendered, 'certgen_stage_duration_seconds_count{stage="smtp_send"}') == 2
+
+
+def test_render_reports_failures_and_items():
+    metrics = Metrics()
+    metrics.count('insert', 25)
+    metrics.failed('insert')
+
+    rendered = metrics.render()
+
+    assert _value(rendered, 'certgen_stage_items_total{stage="insert"}') == 25
+    assert _value(rendered, 'certgen_stage_failures_total{stage="insert"}') == 1
+
+
+def test_replay_records_events_captured_elsewhere():
+    worker, parent = Metrics(), Metrics()
+    with worker.capture() as events:
+        worker.observe('render', 0.2)
+        worker.count('render')
+    assert worker.render().count('stage="render"') == 0
+
+    parent.replay(events)
+
+    rendered = parent.render()
+    assert _value(rendered, 'certgen_stage_duration_seconds_count{stage="render"}') == 1
+    assert _value(rendered, 'certgen_stage_items_total{stage="render"}') == 1
@@ -0,0 +1,91 @@
+import os
+import hashlib
+import threading
+
+import pytest
+
+from utils.storage import (CERTIFICATES, LocalObjectClient, NoSuchKey, ObjectStorage,
+                           storage_from_environment)
+
+
+@pytest.fixture
+def object_storage(tmp_path):
+    return ObjectStorage(LocalObjectClient(str(tmp_path / 'objects')), 'certificates', str(tmp_path / 'cache'))
+
+
+def _write(storage, key, data):
+    with open(storage.local_path(key, for_write=True), 'wb') as f:
+        f.write(data)
+    storage.commit(key)
+
+
+def test_committed_file_is_uploaded_and_downloaded_again_when_the_cache_is_gone(object_storage):
+    key = object_storage.key_for(CERTIFICATES, 'CERT-1.pdf')
+    _write(object_storage, key, b'%PDF-1.4 certificate')
+    os.remove(object_storage.local_path(key))
+
+    assert object_storage.exists(key)
+    with open(object_storage.local_path(key), 'rb') as f:
+        assert f.read() == b'%PDF-1.4 certificate'
+    with object_storage.open(key) as body:
+        assert body.read() == b'%PDF-1.4 certificate'
+
+
+def test_delete_removes_the_object_and_the_cached_file(object_storage):
+    key = object_storage.key_for(CERTIFICATES, 'CERT-2.pdf')
+    _write(object_storage, key, b'data')
+
+    assert object_storage.delete(key)
+
+    assert not object_storage.exists(key)
+    assert not os.path.exists(object_storage.local_path(key, for_write=True))
+    assert not object_storage.delete(key)
+
+
+def test_head_object_reports_size_and_etag_and_raises_for_a_missing_key(tmp_path):
+    client = LocalObjectClient(str(tmp_path))
+    response = client.put_object(Bucket='bucket', Key='a/b.pdf', Body=b'12345')
+
+    head = client.head_object(Bucket='bucket', Key='a/b.pdf')
+    assert head['ContentLength'] == 5
+    assert head['ETag'] == response['ETag'] == f'"{hashlib.md5(b"12345").hexdigest()}"'
+    with pytest.raises(NoSuchKey):
+        client.head_object(Bucket='bucket', Key='a/missing.pdf')
+
+
+def test_concurrent_puts_of_one_key_leave_one_whole_object(tmp_path):
+    client = LocalObjectClient(str(tmp_path))
+    bodies = [bytes([i]) * 256 * 1024 for i in range(8)]
+    errors = []
+
+    def put(body):
+        try:
+            client.put_object(Bucket='bucket', Key='k.pdf', Body=body)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(body,)) for body in bodies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with client.get_object(Bucket='bucket', Key='k.pdf')['Body'] as body:
+        assert body.read() in bodies
+    assert os.listdir(tmp_path / 'bucket') == ['k.pdf']
+
+
+def test_storage_from_environment_builds_the_local_s3_backend(tmp_path):
+    storage = storage_from_environment({
+        'STORAGE_BACKEND': 'local-s3',
+        'STORAGE_ROOT': str(tmp_path),
+        'STORAGE_OBJECT_ROOT': str(tmp_path / 'objects'),
+        'STORAGE_BUCKET': 'bucket',
+    })
+
+    assert isinstance(storage, ObjectStorage)
+    assert isinstance(storage.client, LocalObjectClient)
+    assert storage.bucket == 'bucket'
+    with pytest.raises(ValueError):
+        storage_from_environment({'STORAGE_BACKEND': 'ftp'})
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from utils.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+CERTIFICATE = 'certificate'
+QR_CODE = 'qr_code'
+
+
+class StoredArtifact(db.Model):
+    """One generated file (certificate PDF, QR code) held by the storage backend"""
+    __tablename__ = 'stored_artifact'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    storage_key = db.Column(db.String(500), nullable=False)
+    backend = db.Column(db.String(20), nullable=False)
+    size = db.Column(db.Integer)
+    sha256 = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'name', name='uq_stored_artifact_kind_name'),
+        # Retention cleanup reads the oldest artifacts of one kind
+        db.Index('ix_stored_artifact_kind_created', 'kind', 'created_at'),
+    )
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactManifest:
+    """Database record of every artifact written through the storage layer
+
+    Each artifact is recorded with its storage key, size and SHA-256, one
+    row per (kind, name), so a re-render replaces the previous row.
+    Retention cleanup reads expired rows through the (kind, created_at)
+    index instead of listing directories and stat-ing every file.
+
+    Rows are written on their own connection and committed straight away:
+    the file exists whether or not the caller's transaction commits. On
+    SQLite, record before the caller's session starts writing, or the
+    insert waits on the caller's own lock.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage()
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the stored_artifact table if it does not exist yet"""
+        if not self._table_ready:
+            StoredArtifact.__table__.create(db.engine, checkfirst=True)
+            self._table_ready = True
+
+    def record(self, kind, name, path):
+        """Record one artifact written at a local path, returning its row values"""
+        return self.record_many(kind, [(name, path)]).get(name)
+
+    def record_many(self, kind, artifacts):
+        """Record (name, local path) pairs, returning {name: row values} for the files that exist"""
+        self.init_table()
+        now = datetime.utcnow()
+        rows = []
+        for name, path in artifacts:
+            if not path or not os.path.exists(path):
+                continue
+            rows.append({
+                'kind': kind,
+                'name': name,
+                'storage_key': self.storage.key_from_path(path),
+                'backend': self.storage.backend,
+                'size': os.path.getsize(path),
+                'sha256': file_sha256(path),
+                'created_at': now
+            })
+        if not rows:
+            return {}
+
+        table = StoredArtifact.__table__
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ('sqlite', 'postgresql'):
+                insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+                connection.execute(insert.on_conflict_do_update(
+                    index_elements=[table.c.kind, table.c.name],
+                    set_={column: insert.excluded[column]
+                          for column in ('storage_key', 'backend', 'size', 'sha256', 'created_at')}
+                ), rows)
+            else:
+                connection.execute(table.delete().where(
+                    table.c.kind == kind, table.c.name.in_([row['name'] for row in rows])
+                ))
+                connection.execute(table.insert(), rows)
+        return {row['name']: row for row in rows}
+
+    def cleanup(self, kind, days_old=30, batch_size=500):
+        """Delete artifacts of a kind created more than days_old days ago
+
+        Returns the number of artifacts removed. Files are deleted from the
+        storage backend first, then their rows, one batch at a time.
+        """
+        self.init_table()
+        table = StoredArtifact.__table__
+        cutoff = datetime.utcnow() - timedelta(days=days_old)
+        removed = 0
+        position = None
+        while True:
+            query = select(table.c.id, table.c.storage_key, table.c.created_at).where(
+                table.c.kind == kind, table.c.created_at < cutoff
+            ).order_by(table.c.created_at, table.c.id).limit(batch_size)
+            if position:
+                # Continue after the previous batch; rows whose file could not
+                # be deleted stay in the manifest for the next run
+                query = query.where(tuple_(table.c.created_at, table.c.id) > position)
+            with db.engine.begin() as connection:
+                batch = connection.execute(query).all()
+            if not batch:
+                break
+            position = (batch[-1].created_at, batch[-1].id)
+
+            deleted = []
+            for row in batch:
+                try:
+                    self.storage.delete(row.storage_key)
+                    deleted.append(row.id)
+                except Exception as e:
+                    logger.warning(f"Could not delete {kind} artifact {row.storage_key}: {str(e)}")
+            if deleted:
+                with db.engine.begin() as connection:
+                    connection.execute(delete(table).where(table.c.id.in_(deleted)))
+            removed += len(deleted)
+
+        logger.info(f"Cleaned up {removed} {kind} artifacts older than {days_old} days")
+        return removed
+
+
+artifact_manifest = ArtifactManifest()
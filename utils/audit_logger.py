@@ -0,0 +1,185 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from app import app, db
+from models import CertificateVerification
+from utils.dashboard_stats import dashboard_stats, VERIFICATIONS
+
+logger = logging.getLogger(__name__)
+
+
+class _FlushRequest:
+    """Queue marker asking the writer thread to write everything before it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class VerificationAuditLogger:
+    """Buffered writer for certificate_verification rows
+
+    Requests call log(), which only appends the event to a bounded in-memory
+    queue. A background thread writes the queued events with one multi-row
+    INSERT per batch, as soon as batch_size events are waiting or
+    flush_interval seconds after the first one arrived. When the queue is full
+    log() waits up to block_timeout seconds for room and then drops the event;
+    drops are counted in stats(). Everything still queued is written on
+    shutdown(), which is registered with atexit.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, max_queue=10000, block_timeout=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.failed = 0
+        self.batches = 0
+
+    def log(self, student_id, certificate_id, ip_address=None, user_agent=None,
+            verification_type='qr_scan', location=None):
+        """Queue one verification event; returns False if it had to be dropped"""
+        self.start()
+        now = datetime.utcnow()
+        event = {
+            'student_id': student_id,
+            'certificate_id': certificate_id,
+            'verification_time': now,
+            'ip_address': ip_address,
+            'user_agent': (user_agent or '')[:500] or None,
+            'location': location,
+            'verification_type': verification_type,
+            'created_at': now
+        }
+
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Back-pressure: give the writer a moment before giving up on the event
+            with self._stats_lock:
+                self.blocked += 1
+            try:
+                self._queue.put(event, timeout=self.block_timeout)
+            except queue.Full:
+                with self._stats_lock:
+                    self.dropped += 1
+                logger.warning(f"Verification audit queue full, dropped event for {certificate_id}")
+                return False
+
+        with self._stats_lock:
+            self.logged += 1
+        return True
+
+    def start(self):
+        """Start the writer thread if it is not running yet"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='verification-audit-writer', daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=10):
+        """Block until every event logged so far has been written"""
+        if not self._thread or not self._thread.is_alive():
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def shutdown(self, timeout=10):
+        """Write the remaining events and stop the writer thread"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'logged': self.logged,
+                'written': self.written,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'failed': self.failed,
+                'batches': self.batches
+            }
+
+    def _run(self):
+        pending = []
+        flush_requests = []
+        deadline = None
+
+        while True:
+            stopping = self._stop_event.is_set()
+            timeout = 0.1 if deadline is None else max(0, min(0.1, deadline - time.monotonic()))
+            try:
+                item = self._queue.get(timeout=timeout)
+                if isinstance(item, _FlushRequest):
+                    flush_requests.append(item)
+                else:
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                item = None
+
+            due = deadline is not None and time.monotonic() >= deadline
+            drained = item is None or (stopping and self._queue.empty())
+            if pending and (len(pending) >= self.batch_size or due or flush_requests or (stopping and drained)):
+                self._write(pending)
+                pending = []
+                deadline = None
+
+            if flush_requests and not pending:
+                for request in flush_requests:
+                    request.done.set()
+                flush_requests = []
+
+            if stopping and drained and not pending:
+                return
+
+    def _write(self, events):
+        """Insert a batch of events, retrying once before counting them as failed"""
+        for attempt in (1, 2):
+            with app.app_context():
+                try:
+                    db.session.execute(CertificateVerification.__table__.insert(), events)
+                    # Core inserts skip the ORM flush that keeps the dashboard counter
+                    dashboard_stats.add({VERIFICATIONS: len(events)})
+                    db.session.commit()
+                    with self._stats_lock:
+                        self.written += len(events)
+                        self.batches += 1
+                    return
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error writing {len(events)} verification events (attempt {attempt}): {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(0.5)
+
+        with self._stats_lock:
+            self.failed += len(events)
+
+
+audit_logger = VerificationAuditLogger(
+    batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+    flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 1.0),
+    max_queue=app.config.get('AUDIT_QUEUE_SIZE', 10000)
+)
+atexit.register(audit_logger.shutdown)
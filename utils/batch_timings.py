@@ -0,0 +1,69 @@
+import logging
+from datetime import datetime
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStageTiming(db.Model):
+    """Time one upload batch spent in one pipeline stage (see utils.metrics)"""
+    __tablename__ = 'batch_stage_timing'
+
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch_upload.id'), primary_key=True)
+    stage = db.Column(db.String(30), primary_key=True)
+    seconds = db.Column(db.Float, default=0.0, nullable=False)
+    calls = db.Column(db.Integer, default=0, nullable=False)
+    items = db.Column(db.Integer, default=0, nullable=False)
+    failures = db.Column(db.Integer, default=0, nullable=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    batch = db.relationship('BatchUpload', backref=db.backref('stage_timings', lazy='dynamic'))
+
+
+class BatchTimings:
+    """Per-batch stage timing breakdowns, one row per (batch, stage)"""
+
+    def __init__(self):
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the batch_stage_timing table if it does not exist yet"""
+        if not self._table_ready:
+            BatchStageTiming.__table__.create(db.engine, checkfirst=True)
+            self._table_ready = True
+
+    def record(self, batch_id, breakdown):
+        """Store a breakdown from metrics.collect_breakdown() for a batch, replacing earlier rows
+
+        Timings are diagnostics, so a failure here is logged and does not
+        fail the upload.
+        """
+        if not breakdown:
+            return
+        try:
+            self.init_table()
+            BatchStageTiming.query.filter_by(batch_id=batch_id).delete()
+            for stage, totals in breakdown.items():
+                db.session.add(BatchStageTiming(
+                    batch_id=batch_id,
+                    stage=stage,
+                    seconds=round(totals['seconds'], 6),
+                    calls=totals['calls'],
+                    items=totals['items'],
+                    failures=totals['failures']
+                ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not store stage timings for batch {batch_id}: {str(e)}")
+
+    def get(self, batch_id):
+        """Return {stage: {'seconds', 'calls', 'items', 'failures'}} for a batch"""
+        self.init_table()
+        return {
+            row.stage: {'seconds': row.seconds, 'calls': row.calls, 'items': row.items, 'failures': row.failures}
+            for row in BatchStageTiming.query.filter_by(batch_id=batch_id).order_by(BatchStageTiming.stage)
+        }
+
+
+batch_timings = BatchTimings()
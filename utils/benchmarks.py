@@ -0,0 +1,129 @@
+"""Micro-benchmarks for the certificate pipeline.
+
+Run from the project root, e.g.:
+
+    python -m utils.benchmarks qr_rendering 50
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKGROUND_IMAGE = 'attached_assets/_Internship Certificate.png'
+
+
+def _sample_student(index):
+    """Build a student record with realistic field lengths"""
+    from utils.certificate_generator import StudentRecord
+    return StudentRecord(
+        student_name=f"STUDENT NUMBER {index}",
+        certificate_id=f"CERT-20250101-{index:08X}",
+        roll_number=f"21B01A{index:04d}",
+        college_name="GVP College of Engineering",
+        internship_name="AI Research Internship",
+        internship_start_date=datetime(2024, 5, 1),
+        internship_end_date=datetime(2024, 7, 1),
+        duration_weeks=8,
+        mentor_name="Srinivas",
+        company_name="CSC India",
+        performance_rating="Excellent"
+    )
+
+
+def benchmark_qr_rendering(count=50, background_image_path=DEFAULT_BACKGROUND_IMAGE):
+    """Compare raster (PNG) and vector QR rendering by render time and PDF size"""
+    from utils.certificate_generator import CertificateGenerator
+    from utils.qr_generator import QRGenerator
+
+    qr_gen = QRGenerator()
+    students = [_sample_student(i) for i in range(count)]
+    payloads = [qr_gen.generate_verification_data(s.certificate_id) for s in students]
+    results = {}
+
+    cwd = os.getcwd()
+    background_image_path = os.path.abspath(background_image_path)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for mode in ('image', 'vector'):
+                generator = CertificateGenerator(qr_render_mode=mode)
+                # Warm the background cache so only QR handling differs
+                generator.render_with_payload(students[0], background_image_path, qr_payload=payloads[0])
+
+                sizes = []
+                start = time.perf_counter()
+                for student, payload in zip(students, payloads):
+                    path = generator.render_with_payload(student, background_image_path, qr_payload=payload)
+                    sizes.append(os.path.getsize(path))
+                elapsed = time.perf_counter() - start
+
+                results[mode] = {
+                    'ms_per_certificate': elapsed * 1000 / count,
+                    'avg_pdf_bytes': sum(sizes) / count
+                }
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+def benchmark_id_allocation(count=100000, block_size=1000):
+    """Time allocating certificate IDs in one call and one at a time, and check they are unique
+
+    Runs against a temporary SQLite database, so the counters of the
+    app's own database are left alone.
+    """
+    from flask import Flask
+    from app import db
+    from utils.id_allocator import CertificateIdAllocator, has_valid_check_digit
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_app = Flask(__name__)
+        bench_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+        db.init_app(bench_app)
+
+        with bench_app.app_context():
+            for mode in ('block', 'single'):
+                allocator = CertificateIdAllocator(block_size=block_size)
+                allocator.allocate(1)
+
+                start = time.perf_counter()
+                if mode == 'block':
+                    ids = allocator.allocate(count)
+                else:
+                    ids = [allocator.allocate(1)[0] for _ in range(count)]
+                elapsed = time.perf_counter() - start
+
+                if len(set(ids)) != count or not all(has_valid_check_digit(cert_id) for cert_id in ids):
+                    raise AssertionError(f"{mode} allocation returned duplicate or malformed IDs")
+                results[mode] = {
+                    'ms_total': elapsed * 1000,
+                    'ids_per_second': count / elapsed
+                }
+            db.engine.dispose()
+
+    return results
+
+
+def _print_results(title, results):
+    print(title)
+    for name, values in results.items():
+        print(f"  {name:<8} " + "  ".join(f"{key}={value:,.1f}" for key, value in values.items()))
+
+
+BENCHMARKS = {
+    'qr_rendering': benchmark_qr_rendering,
+    'id_allocation': benchmark_id_allocation,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    name = sys.argv[1] if len(sys.argv) > 1 else 'qr_rendering'
+    args = [int(arg) for arg in sys.argv[2:]]
+    _print_results(name, BENCHMARKS[name](*args))
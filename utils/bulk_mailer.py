@@ -0,0 +1,299 @@
+import io
+import os
+import time
+import queue
+import logging
+import smtplib
+import threading
+from email.parser import BytesHeaderParser
+from flask_mail import email_dispatched
+from app import mail, app
+from utils.metrics import metrics, SMTP_SEND
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly to at most per_minute per minute"""
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may send the next message"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Size of the buffered writes used when streaming a message over SMTP
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class StreamedMessage:
+    """A fully serialized MIME message on disk, streamed to the server in chunks
+
+    BulkMailer sends these with send_streamed instead of Flask-Mail's
+    Connection.send, so the message is never held in memory as a whole.
+    Temporary messages are deleted once their send has been attempted.
+    When sending is suppressed (TESTING or MAIL_SUPPRESS_SEND) the message
+    is read into memory instead, so copies captured by mail.record_messages()
+    stay readable after the file is gone.
+    """
+
+    def __init__(self, sender, recipients, message_path, temporary=False):
+        self.sender = sender
+        self.send_to = list(recipients)
+        self.message_path = message_path
+        self.temporary = temporary
+        self._data = None
+
+    @property
+    def recipients(self):
+        return self.send_to
+
+    @property
+    def subject(self):
+        return self.headers['Subject']
+
+    @property
+    def headers(self):
+        with self.open() as fp:
+            return BytesHeaderParser().parse(fp)
+
+    def keep_in_memory(self):
+        if self._data is None:
+            with self.open() as fp:
+                self._data = fp.read()
+
+    def as_bytes(self):
+        if self._data is not None:
+            return self._data
+        with self.open() as fp:
+            return fp.read()
+
+    def open(self):
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self.message_path, 'rb')
+
+    def discard(self):
+        if self.temporary:
+            try:
+                os.remove(self.message_path)
+            except OSError:
+                pass
+
+
+def send_streamed(connection, message):
+    """Send a StreamedMessage over an open Flask-Mail connection
+
+    This is smtplib's sendmail split into its SMTP commands so the DATA phase
+    can be fed from the file a chunk at a time, with line endings normalized
+    to CRLF and leading dots escaped as sendmail would.
+
+    Like Connection.send, emits Flask-Mail's email_dispatched signal once
+    the message is handed over. Returns the recipients the server refused,
+    as sendmail does; the message was still delivered to the others.
+    """
+    host = connection.host
+    if host is None:
+        # MAIL_SUPPRESS_SEND or testing mode: nothing is sent, but listeners
+        # such as mail.record_messages() still see the message
+        message.keep_in_memory()
+        email_dispatched.send(app, message=message)
+        return {}
+
+    host.ehlo_or_helo_if_needed()
+    code, response = host.mail(message.sender)
+    if code != 250:
+        host.rset()
+        raise smtplib.SMTPSenderRefused(code, response, message.sender)
+
+    refused = {}
+    for recipient in message.send_to:
+        code, response = host.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(message.send_to):
+        host.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    if refused:
+        logger.warning(f"Server refused {len(refused)} of {len(message.send_to)} recipients: "
+                       f"{', '.join(f'{recipient} ({code})' for recipient, (code, _) in refused.items())}")
+
+    code, response = host.docmd('data')
+    if code != 354:
+        host.rset()
+        raise smtplib.SMTPDataError(code, response)
+
+    buffer = bytearray()
+    with message.open() as fp:
+        for line in fp:
+            if line.startswith(b'.'):
+                buffer += b'.'
+            buffer += line.rstrip(b'\r\n')
+            buffer += b'\r\n'
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                host.send(bytes(buffer))
+                buffer.clear()
+    buffer += b'.\r\n'
+    host.send(bytes(buffer))
+
+    code, response = host.getreply()
+    if code != 250:
+        host.rset()
+        raise smtplib.SMTPDataError(code, response)
+
+    email_dispatched.send(app, message=message)
+    return refused
+
+
+class BulkMailer:
+    """Send many messages concurrently over pooled SMTP connections
+
+    Each worker thread keeps one Flask-Mail connection (mail.connect()) open
+    and sends a series of messages over it, reconnecting after
+    messages_per_connection messages or when the server has dropped the
+    session. A dropped session is found with NOOP before the next message
+    is started, so a message is never sent twice: a failure once its
+    MAIL command has gone out is reported, not retried.
+    Messages are built lazily by the workers from (key, recipient, builder)
+    tasks passed through a bounded queue, so only a few messages are held in
+    memory at any time regardless of batch size.
+
+    The SMTP server comes from the app's MAIL_* settings, so pointing
+    MAIL_SERVER/MAIL_PORT at a local aiosmtpd or debugging server is enough
+    to exercise it without sending real e-mail.
+    """
+
+    def __init__(self, workers=None, rate_per_minute=None, messages_per_connection=100):
+        self.workers = workers or app.config.get('MAIL_BULK_WORKERS', 4)
+        self.rate_limiter = RateLimiter(
+            rate_per_minute if rate_per_minute is not None
+            else app.config.get('MAIL_RATE_LIMIT_PER_MINUTE')
+        )
+        self.messages_per_connection = messages_per_connection
+
+    def send_all(self, tasks, on_result=None):
+        """Send every task and return one outcome dict per task
+
+        tasks is an iterable of (key, recipient, builder) tuples where builder
+        is a callable returning a flask_mail Message or a StreamedMessage, or
+        None to skip the task (its outcome has skipped set). on_result, if given, is
+        called from the worker threads with each outcome as it completes.
+        """
+        task_queue = queue.Queue(maxsize=self.workers * 2)
+        results = []
+        results_lock = threading.Lock()
+
+        def record(outcome):
+            with results_lock:
+                results.append(outcome)
+            if on_result:
+                on_result(outcome)
+
+        threads = [
+            threading.Thread(target=self._worker, args=(task_queue, record),
+                             name=f"bulk-mailer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for task in tasks:
+                task_queue.put(task)
+        finally:
+            # Even if tasks raised, every worker gets its stop marker
+            for _ in threads:
+                task_queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        successful = sum(1 for outcome in results if outcome['success'])
+        logger.info(f"Bulk mail sent {successful} of {len(results)} messages "
+                    f"using {self.workers} connections")
+        return results
+
+    def _worker(self, task_queue, record):
+        with app.app_context():
+            connection = None
+            sent_on_connection = 0
+            try:
+                while True:
+                    task = task_queue.get()
+                    if task is None:
+                        break
+
+                    key, recipient, builder = task
+                    message = None
+                    try:
+                        message = builder()
+                        if message is None:
+                            record({'key': key, 'recipient': recipient, 'success': False, 'error': None,
+                                    'permanent': False, 'skipped': True})
+                            continue
+                        if (connection is None or sent_on_connection >= self.messages_per_connection
+                                or not self._is_alive(connection)):
+                            self._close(connection)
+                            connection = None
+                            connection = self._open()
+                            sent_on_connection = 0
+
+                        self.rate_limiter.acquire()
+                        refused = self._send(connection, message)
+
+                        sent_on_connection += 1
+                        record({'key': key, 'recipient': recipient, 'success': True, 'error': None,
+                                'permanent': False, 'refused': list(refused)})
+
+                    except Exception as e:
+                        logger.error(f"Error sending e-mail to {recipient}: {str(e)}")
+                        # A refused recipient will be refused again, so retrying it is pointless
+                        record({'key': key, 'recipient': recipient, 'success': False, 'error': str(e),
+                                'permanent': isinstance(e, smtplib.SMTPRecipientsRefused)})
+                    finally:
+                        if isinstance(message, StreamedMessage):
+                            message.discard()
+            finally:
+                self._close(connection)
+
+    @metrics.timed(SMTP_SEND)
+    def _send(self, connection, message):
+        refused = {}
+        if isinstance(message, StreamedMessage):
+            refused = send_streamed(connection, message)
+        else:
+            connection.send(message)
+        metrics.count(SMTP_SEND)
+        return refused
+
+    def _is_alive(self, connection):
+        """Check that a pooled session is still open before a message is started on it"""
+        if connection.host is None:
+            return True
+        try:
+            return connection.host.noop()[0] == 250
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            return False
+
+    def _open(self):
+        connection = mail.connect()
+        connection.__enter__()
+        return connection
+
+    def _close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass
@@ -0,0 +1,208 @@
+import os
+import time
+import logging
+import zipfile
+import tempfile
+from datetime import datetime
+from flask import Response, request, stream_with_context
+from sqlalchemy import select
+from app import db
+from models import Student, Certificate, CertificateStatus
+from utils.certificate_listing import certificate_listing
+from utils.storage import default_storage, CERTIFICATES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKGROUND_IMAGE = 'attached_assets/_Internship Certificate.png'
+
+# Students whose certificates have been issued and can be bundled
+BUNDLE_STATUSES = (CertificateStatus.GENERATED, CertificateStatus.SENT)
+
+
+class _StreamSink:
+    """Write-only file object that hands the bytes written to it to the response
+
+    zipfile writes to it as to a pipe (no seek or tell), so each entry gets a
+    data descriptor after its data instead of a header patched afterwards.
+    """
+
+    def __init__(self):
+        self._pieces = []
+
+    def write(self, data):
+        self._pieces.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def zip_chunks(entries, read_size=64 * 1024):
+    """Yield a ZIP archive of (archive name, local path) entries as it is written
+
+    Entries are stored without compression (PDFs are compressed already), so
+    each file is copied through in read_size pieces and memory use does not
+    depend on the number or size of the files. entries may be a generator;
+    it is only advanced once the previous file has been sent.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(os.path.getmtime(path))[:6])
+            info.file_size = os.path.getsize(path)
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                for block in iter(lambda: source.read(read_size), b''):
+                    target.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+class CertificateBundle:
+    """Collect the certificate PDFs for a set of students into a streamed ZIP
+
+    Students are read in id order, chunk_size at a time, with the same
+    filters as the certificates listing. A certificate whose PDF is missing
+    from storage is rendered again when the download reaches it, and its
+    Certificate row is pointed at the new file.
+    """
+
+    def __init__(self, background_image_path=DEFAULT_BACKGROUND_IMAGE, storage=None):
+        self.background_image_path = background_image_path
+        self.storage = storage or default_storage()
+        self._generator = None
+        self._qr_gen = None
+
+    def entries(self, chunk_size=500, missing=None, **filters):
+        """Yield (archive name, local path) for each selected student's certificate
+
+        Certificates that can be neither found nor rendered are skipped and
+        their IDs appended to missing, when a list is given.
+        """
+        latest = select(Certificate.id).where(
+            Certificate.student_id == Student.id
+        ).order_by(Certificate.id.desc()).limit(1).scalar_subquery()
+        query = certificate_listing.filtered_query(**filters).filter(
+            Student.certificate_status.in_(BUNDLE_STATUSES),
+            Student.certificate_id.isnot(None)
+        ).with_entities(Student.id, Student.certificate_id, latest.label('certificate_row_id')).order_by(Student.id)
+
+        last_id = 0
+        while True:
+            chunk = query.filter(Student.id > last_id).limit(chunk_size).all()
+            paths = dict(
+                db.session.query(Certificate.id, Certificate.certificate_path)
+                .filter(Certificate.id.in_([row.certificate_row_id for row in chunk if row.certificate_row_id]))
+                .all()
+            ) if chunk else {}
+            # Like the exports, no read transaction is held while the client downloads
+            db.session.rollback()
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+
+            for row in chunk:
+                path = self._stored_path(row.certificate_id, paths.get(row.certificate_row_id))
+                if path is None:
+                    path = self._render_missing(row.id, row.certificate_row_id)
+                if path is None:
+                    if missing is not None:
+                        missing.append(row.certificate_id)
+                    continue
+                yield f"certificate_{row.certificate_id}.pdf", path
+
+    def _stored_path(self, certificate_id, recorded_path):
+        """Return a local path to the certificate's existing PDF, or None"""
+        if recorded_path and os.path.exists(recorded_path):
+            return recorded_path
+        key = self.storage.key_for(CERTIFICATES, f"certificate_{certificate_id}.pdf")
+        try:
+            if self.storage.exists(key):
+                return self.storage.local_path(key)
+        except Exception as e:
+            logger.warning(f"Could not fetch certificate {certificate_id} from storage: {str(e)}")
+        return None
+
+    def _render_missing(self, student_id, certificate_row_id):
+        """Render a missing certificate PDF again and record where it now lives"""
+        from utils.certificate_generator import CertificateGenerator
+        from utils.qr_generator import QRGenerator
+        from utils.artifact_manifest import artifact_manifest, CERTIFICATE
+
+        if self._generator is None:
+            self._generator = CertificateGenerator()
+            self._qr_gen = QRGenerator()
+
+        student = db.session.get(Student, student_id)
+        try:
+            qr_payload = self._qr_gen.build_payload(student.certificate_id, student)
+            path = self._generator.render_with_payload(student, self.background_image_path, qr_payload=qr_payload)
+            artifact = artifact_manifest.record(CERTIFICATE, student.certificate_id, path)
+
+            certificate = db.session.get(Certificate, certificate_row_id) if certificate_row_id else None
+            if certificate is None:
+                certificate = Certificate(
+                    student_id=student.id,
+                    qr_code_data=qr_payload
+                )
+                db.session.add(certificate)
+            certificate.certificate_path = path
+            certificate.file_size = artifact['size'] if artifact else None
+            db.session.commit()
+            logger.info(f"Rendered missing certificate {student.certificate_id} for bundle download")
+            return path
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Could not render missing certificate {student.certificate_id}: {str(e)}")
+            return None
+
+
+def bundle_response():
+    """Build a streamed ZIP download of certificates for the listing filters in request.args
+
+    Accepts the same status, college, branch, internship and search
+    arguments as the certificates listing API. Certificates that could not
+    be included are listed in missing_certificates.txt at the end of the
+    archive.
+    """
+    args = request.args
+    filters = {name: args.get(name) or None for name in ('status', 'college', 'branch', 'internship', 'search')}
+    if filters['status'] and filters['status'] not in {status.value for status in BUNDLE_STATUSES}:
+        return Response(f"Certificates can only be bundled for statuses: "
+                        f"{', '.join(status.value for status in BUNDLE_STATUSES)}", status=400)
+
+    bundle = CertificateBundle()
+    missing = []
+
+    def chunks():
+        entries = bundle.entries(missing=missing, **filters)
+        for chunk in zip_chunks(_with_missing_list(entries, missing)):
+            if chunk:
+                yield chunk
+
+    filename = f"certificates_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+    logger.info(f"Streaming certificate bundle with filters {filters}")
+    return Response(
+        stream_with_context(chunks()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+def _with_missing_list(entries, missing):
+    """Pass entries through, then add a text file naming the certificates left out"""
+    yield from entries
+    if missing:
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(missing) + '\n')
+        try:
+            yield 'missing_certificates.txt', path
+        finally:
+            os.remove(path)
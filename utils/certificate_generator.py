@@ -5,21 +5,47 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from PIL import Image
+from utils.qr_generator import make_qr_image, make_qr_matrix, worker_pool
+from utils.storage import default_storage, CERTIFICATES
+from utils.metrics import metrics, RENDER, SAVE
+import hashlib
+import json
+import uuid
 import logging
+from concurrent.futures import wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Scaled background images, one file per template version
+BACKGROUND_CACHE_FOLDER = os.environ.get('BACKGROUND_CACHE_FOLDER', 'cache/backgrounds')
+
+# JPEG quality for the cached background; unset keeps it lossless (PNG)
+BACKGROUND_JPEG_QUALITY = os.environ.get('BACKGROUND_JPEG_QUALITY')
+
+# Student fields printed on every certificate
+REQUIRED_FIELDS = ('certificate_id', 'student_name', 'internship_name',
+                   'internship_start_date', 'internship_end_date')
+
 class CertificateGenerator:
     """Generate PDF certificates with dynamic content using a background image"""
     
-    def __init__(self):
+    def __init__(self, qr_render_mode='image', storage=None):
         self.cert_width, self.cert_height = landscape(A4)
         self.margin = 0.5 * inch
         
+        # How QR codes encoded from payloads are drawn: 'image' embeds a raster
+        # image, 'vector' draws the modules as filled rectangles
+        self.qr_render_mode = qr_render_mode
+        
+        # Where certificate PDFs are written (utils.storage)
+        self.storage = storage or default_storage()
+        
         # Try to register custom fonts (fallback to default if not available)
         try:
             # Register fonts if available (e.g., pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf')))
@@ -28,7 +54,8 @@ class CertificateGenerator:
         except Exception as e:
             logger.warning(f"Custom fonts not available, using default fonts: {e}")
     
-    def generate_certificate(self, student, background_image_path, qr_code_path=None):
+    def generate_certificate(self, student, background_image_path, qr_code_path=None, qr_image=None,
+                             qr_matrix=None):
         """
         Generate certificate PDF for a student with a custom background image.
         
@@ -38,33 +65,27 @@ class CertificateGenerator:
                      internship_end_date, mentor_name, company_name, performance_rating).
             background_image_path (str): Path to the background image for the certificate.
             qr_code_path (str, optional): Path to the QR code image. Defaults to None.
+            qr_image (PIL.Image, optional): In-memory QR code image, used instead of
+                                            qr_code_path so no QR file is needed.
+            qr_matrix (list, optional): QR module matrix from make_qr_matrix, drawn as
+                                        vector shapes instead of an image.
         """
         try:
-            # Create certificates directory if it doesn't exist
-            cert_dir = 'certificates'
-            os.makedirs(cert_dir, exist_ok=True)
-            
-            # Generate filename
+            # Generate filename; the storage layer shards it into a subfolder
             filename = f"certificate_{student.certificate_id}.pdf"
-            filepath = os.path.join(cert_dir, filename)
+            key = self.storage.key_for(CERTIFICATES, filename)
+            filepath = self.storage.local_path(key, for_write=True)
             
             # Create PDF
-            c = canvas.Canvas(filepath, pagesize=landscape(A4))
-            
-            # Draw background image first to fill the entire canvas
-            self._draw_certificate_background(c, background_image_path)
-            
-            # Draw dynamic content on top of the background image
-            self._draw_header_dynamic_content(c, student) # For Cert No and Date
-            self._draw_student_info(c, student)
-            self._draw_footer(c, student) # For signatures and organization details
-            
-            # Add QR code if provided
-            if qr_code_path and os.path.exists(qr_code_path):
-                self._add_qr_code(c, qr_code_path)
+            with metrics.timer(RENDER):
+                c = canvas.Canvas(filepath, pagesize=landscape(A4))
+                self._draw_page(c, student, background_image_path, qr_code_path, qr_image, qr_matrix)
             
             # Save PDF
-            c.save()
+            with metrics.timer(SAVE):
+                c.save()
+                self.storage.commit(key)
+            metrics.count(RENDER)
             
             logger.info(f"Certificate generated successfully: {filepath}")
             return filepath
@@ -73,6 +94,211 @@ class CertificateGenerator:
             logger.error(f"Error generating certificate for student {student.certificate_id}: {str(e)}")
             raise
     
+    def _draw_page(self, c, student, background_image_path, qr_code_path=None, qr_image=None,
+                   qr_matrix=None, paragraph=None):
+        """Draw one complete certificate on the current page of the canvas."""
+        # Draw background image first to fill the entire canvas
+        self._draw_certificate_background(c, background_image_path)
+        
+        # Draw dynamic content on top of the background image
+        self._draw_header_dynamic_content(c, student) # For Cert No and Date
+        self._draw_student_info(c, student, paragraph)
+        self._draw_static_footer(c, student) # For signatures and organization details
+        
+        # Add QR code if provided
+        if qr_matrix is not None:
+            self._add_qr_code(c, qr_matrix=qr_matrix)
+        elif qr_image is not None:
+            self._add_qr_code(c, ImageReader(qr_image))
+        elif qr_code_path and os.path.exists(qr_code_path):
+            self._add_qr_code(c, qr_code_path)
+
+    def render_with_payload(self, student, background_image_path, qr_code_path=None, qr_payload=None):
+        """Generate a certificate, encoding qr_payload in memory in the configured render mode."""
+        if qr_payload and self.qr_render_mode == 'vector':
+            return self.generate_certificate(student, background_image_path,
+                                             qr_matrix=make_qr_matrix(qr_payload))
+        if qr_payload:
+            return self.generate_certificate(student, background_image_path,
+                                             qr_image=make_qr_image(qr_payload))
+        return self.generate_certificate(student, background_image_path, qr_code_path)
+
+    def fingerprint(self, student, background_image_path, qr_code_path=None, qr_payload=None):
+        """Return a digest of everything drawn on the student's certificate.
+
+        Two renders with the same fingerprint produce the same certificate
+        (apart from the printed generation date), so a PDF already rendered
+        for this fingerprint can be reused instead of rendering it again.
+        """
+        return certificate_fingerprint(student, background_image_path, qr_code_path, qr_payload,
+                                       self.qr_render_mode)
+
+    def _prepare_page(self, student, qr_code_path=None, qr_payload=None):
+        """Build the data-dependent parts of a student's page before anything is drawn.
+
+        Checks the fields printed on the certificate, lays out the certificate
+        text and encodes the QR code, so a student whose page cannot be drawn
+        raises here instead of halfway through the page.
+
+        Returns:
+            dict: Keyword arguments for _draw_page.
+        """
+        missing = [field for field in REQUIRED_FIELDS if not getattr(student, field, None)]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)}")
+
+        page = {'paragraph': self._certificate_paragraph(student)}
+        if qr_payload and self.qr_render_mode == 'vector':
+            page['qr_matrix'] = make_qr_matrix(qr_payload)
+        elif qr_payload:
+            page['qr_image'] = make_qr_image(qr_payload)
+        else:
+            page['qr_code_path'] = qr_code_path
+        return page
+
+    def generate_combined(self, students, background_image_path, output_path, qr_code_paths=None,
+                          qr_payload_builder=None):
+        """
+        Generate one multi-page PDF holding a certificate page for every student.
+        
+        The background image is embedded once and the footer is recorded once
+        as a form, and every page refers to them, so each extra page only adds
+        its own text and QR code.
+        
+        Args:
+            students: Iterable of student objects. A generator or a query using
+                      yield_per keeps the student rows out of memory.
+            background_image_path (str): Path to the background image for the certificates.
+            output_path (str): Path of the combined PDF to write.
+            qr_code_paths (dict, optional): Maps certificate_id to a QR code image path.
+            qr_payload_builder (callable, optional): Called with each student to get its QR
+                                                     payload, which is encoded in memory for
+                                                     the page instead of read from disk.
+        
+        Returns:
+            dict: path, pages and a list of per-student errors. Students whose
+                  page cannot be prepared are left out and listed in errors.
+        """
+        qr_code_paths = qr_code_paths or {}
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        c = canvas.Canvas(output_path, pagesize=landscape(A4))
+        pages = 0
+        errors = []
+
+        for student in students:
+            # Everything that depends on the student's data is prepared first,
+            # so a bad row is skipped before any of its page is on the canvas
+            try:
+                qr_payload = qr_payload_builder(student) if qr_payload_builder else None
+                page = self._prepare_page(student, qr_code_paths.get(student.certificate_id), qr_payload)
+            except Exception as e:
+                errors.append({'certificate_id': student.certificate_id, 'error': str(e)})
+                logger.error(f"Error adding certificate page for student {student.certificate_id}: {str(e)}")
+                continue
+            self._draw_page(c, student, background_image_path, **page)
+            c.showPage()
+            pages += 1
+
+        c.save()
+
+        logger.info(f"Combined certificate PDF generated with {pages} pages: {output_path}")
+        return {'path': output_path, 'pages': pages, 'errors': errors}
+
+    def generate_batch(self, students, background_image_path, qr_code_paths=None,
+                       max_workers=None, max_in_flight=None, qr_payloads=None, executor=None):
+        """
+        Generate certificates for many students in parallel worker processes.
+
+        Args:
+            students: Iterable of student objects; each is converted to a
+                      picklable StudentRecord before being sent to a worker.
+            background_image_path (str): Path to the background image for the certificates.
+            qr_code_paths (dict, optional): Maps certificate_id to a QR code image path.
+            max_workers (int, optional): Number of worker processes. Defaults to the CPU count.
+            max_in_flight (int, optional): Maximum number of renders queued at once.
+                                           Defaults to four per worker.
+            qr_payloads (dict, optional): Maps certificate_id to QR payload data. The
+                                          workers encode these QR codes in memory, so
+                                          no QR image files are written or read.
+            executor (ProcessPoolExecutor, optional): Pool to render in, from worker_pool().
+                                          Callers rendering several batches should pass one pool for all
+                                          of them, so each worker keeps its generator
+                                          and prepared background between batches.
+                                          Defaults to a pool created for this call.
+
+        Returns:
+            list: One dict per student, in input order, with certificate_id,
+                  certificate_path, success and error keys.
+        """
+        qr_code_paths = qr_code_paths or {}
+        qr_payloads = qr_payloads or {}
+        max_workers = max_workers or os.cpu_count() or 1
+        max_in_flight = max_in_flight or max_workers * 4
+
+        results = []
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index]['certificate_path'], events = future.result()
+                    results[index]['success'] = True
+                    # Timings recorded in the worker process
+                    metrics.replay(events)
+                except Exception as e:
+                    metrics.failed(RENDER)
+                    results[index]['error'] = str(e)
+                    logger.error(f"Error generating certificate for student "
+                                 f"{results[index]['certificate_id']}: {str(e)}")
+
+        with nullcontext(executor) if executor else worker_pool(max_workers) as executor:
+            for student in students:
+                record = StudentRecord.from_student(student)
+                results.append({
+                    'certificate_id': record.certificate_id,
+                    'certificate_path': None,
+                    'success': False,
+                    'error': None
+                })
+
+                # Keep the number of queued renders bounded so memory stays flat
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                future = executor.submit(
+                    _render_in_worker, record, background_image_path,
+                    qr_code_paths.get(record.certificate_id),
+                    qr_payloads.get(record.certificate_id),
+                    self.qr_render_mode
+                )
+                pending[future] = len(results) - 1
+
+            if pending:
+                done, _ = wait(pending)
+                collect(done)
+
+        generated = sum(1 for result in results if result['success'])
+        logger.info(f"Batch generated {generated} of {len(results)} certificates "
+                    f"using {max_workers} processes")
+        return results
+
+    def _draw_static_footer(self, c, student):
+        """Draw the footer, which is identical on every certificate.
+
+        It is recorded once per PDF document as a form XObject, so pages
+        sharing a document reuse it instead of redrawing it.
+        """
+        if not c.hasForm('certificate_footer'):
+            c.beginForm('certificate_footer')
+            self._draw_footer(c, student)
+            c.endForm()
+        c.doForm('certificate_footer')
+
     def _draw_certificate_background(self, c, image_path):
         """Draw the background image for the certificate, scaling it to fit the page."""
         try:
@@ -82,7 +308,9 @@ class CertificateGenerator:
 
             # Draw the image to fill the entire canvas (A4 landscape: 842x595 points)
             # The image will be stretched/compressed to fit these dimensions.
-            c.drawImage(image_path, 0, 0, width=self.cert_width, height=self.cert_height)
+            # The decoded, scaled and encoded image is cached per process.
+            template = get_background_template(image_path, (self.cert_width, self.cert_height))
+            template.draw(c, 0, 0, self.cert_width, self.cert_height)
         except Exception as e:
             logger.error(f"Error drawing background image: {e}")
             # Fallback: if image fails to load or draw, draw a simple white background
@@ -108,21 +336,8 @@ class CertificateGenerator:
         c.setFont("Helvetica-Bold", 10)
         c.drawString(self.cert_width - 120, self.cert_height - 85, f"{datetime.now().strftime('%d/%m/%Y')}")
 
-    def _draw_student_info(self, c, student):
-        """Draw student information section on the background image."""
-        # Student name (large and prominent)
-        # Positioned centrally, below "THIS CERTIFICATE IS PROUDLY PRESENTED TO" in the template.
-        # Estimated Y-coordinate based on visual inspection of the template image.
-        y_name = self.cert_height - 320 # This aligns with the image's name placement
-        
-        c.setFont("Helvetica-Bold", 32)
-        c.setFillColor(colors.black)
-        name_width = c.stringWidth(student.student_name, "Helvetica-Bold", 32)
-        c.drawString((self.cert_width - name_width) / 2, y_name, student.student_name)
-        
-        # The background image already has a decorative line under the name,
-        # so drawing an additional line here is not necessary.
-        
+    def _certificate_paragraph(self, student):
+        """Build the certificate text below the student name as a Paragraph."""
         # Certification text that incorporates all dynamic student details.
         # This text appears as a paragraph below the student name.
         # Using ReportLab's Paragraph for better text flow and automatic wrapping.
@@ -144,7 +359,28 @@ class CertificateGenerator:
         )
 
         # Create a Paragraph object from the HTML-like text
-        p = Paragraph(full_cert_text, normal_style)
+        return Paragraph(full_cert_text, normal_style)
+
+    def _draw_student_info(self, c, student, paragraph=None):
+        """Draw student information section on the background image.
+
+        paragraph is the certificate text from _certificate_paragraph, built
+        here when not given.
+        """
+        # Student name (large and prominent)
+        # Positioned centrally, below "THIS CERTIFICATE IS PROUDLY PRESENTED TO" in the template.
+        # Estimated Y-coordinate based on visual inspection of the template image.
+        y_name = self.cert_height - 320 # This aligns with the image's name placement
+        
+        c.setFont("Helvetica-Bold", 32)
+        c.setFillColor(colors.black)
+        name_width = c.stringWidth(student.student_name, "Helvetica-Bold", 32)
+        c.drawString((self.cert_width - name_width) / 2, y_name, student.student_name)
+        
+        # The background image already has a decorative line under the name,
+        # so drawing an additional line here is not necessary.
+        
+        p = paragraph if paragraph is not None else self._certificate_paragraph(student)
 
         # Define the maximum width for the text block, considering page margins.
         text_block_width = self.cert_width - 2 * self.margin 
@@ -262,8 +498,12 @@ class CertificateGenerator:
         web_width = c.stringWidth(website, "Helvetica", 12)
         c.drawString((self.cert_width - web_width) / 2, footer_y - 45, website)
     
-    def _add_qr_code(self, c, qr_code_path):
-        """Add QR code to certificate with verification details at the top-right position as per the image template."""
+    def _add_qr_code(self, c, qr_code_path=None, qr_matrix=None):
+        """Add QR code to certificate with verification details at the top-right position as per the image template.
+
+        qr_code_path may be a file path or an ImageReader wrapping an in-memory image.
+        When qr_matrix is given the modules are drawn as vector rectangles instead.
+        """
         try:
             # Position QR code in top right corner as per image_7ab15a.png
             qr_size = 80 # Size of the QR code image
@@ -282,8 +522,11 @@ class CertificateGenerator:
             c.rect(x_position - 4, y_position - 4, qr_size + 8, qr_size + 8, fill=0, stroke=1)
             
             # Draw the QR code image itself
-            c.drawImage(qr_code_path, x_position, y_position, 
-                        width=qr_size, height=qr_size)
+            if qr_matrix is not None:
+                self._draw_qr_matrix(c, qr_matrix, x_position, y_position, qr_size)
+            else:
+                c.drawImage(qr_code_path, x_position, y_position, 
+                            width=qr_size, height=qr_size)
             
             # Add verification text below the QR code
             c.setFont("Helvetica-Bold", 9)
@@ -314,6 +557,216 @@ class CertificateGenerator:
         except Exception as e:
             logger.error(f"Error adding QR code to certificate: {str(e)}")
 
+    def _draw_qr_matrix(self, c, qr_matrix, x, y, size):
+        """Draw a QR module matrix as one filled path of rectangles.
+
+        Adjacent dark modules in a row are merged into a single rectangle,
+        which keeps the path short and the printed modules crisp.
+        """
+        module = size / len(qr_matrix)
+        path = c.beginPath()
+        for row_index, row in enumerate(qr_matrix):
+            row_y = y + size - (row_index + 1) * module
+            run_start = None
+            for col_index, dark in enumerate(list(row) + [False]):
+                if dark and run_start is None:
+                    run_start = col_index
+                elif not dark and run_start is not None:
+                    path.rect(x + run_start * module, row_y, (col_index - run_start) * module, module)
+                    run_start = None
+        c.setFillColor(colors.black)
+        c.drawPath(path, fill=1, stroke=0)
+
+
+class BackgroundTemplate:
+    """Background image decoded, scaled to page resolution and saved once.
+
+    The image is flattened onto the white page and scaled to at most max_dpi,
+    then saved under cache_folder for canvas.drawImage to embed. It is kept
+    lossless as a PNG unless a JPEG quality is given; a JPEG is copied into
+    each document as it is, a PNG is compressed again for every document.
+    Files left over from older versions of the same image are deleted when
+    a new one is saved.
+    """
+
+    def __init__(self, image_path, page_size, max_dpi=200, quality=None, cache_folder=None):
+        self.image_path = image_path
+        stat = os.stat(image_path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        cache_folder = cache_folder or BACKGROUND_CACHE_FOLDER
+        # Files share a prefix per image and rendering settings, and the
+        # suffix changes with the image file's version
+        source = hashlib.md5(
+            f"{os.path.abspath(image_path)}:{tuple(page_size)}:{max_dpi}:{quality}".encode('utf-8')
+        ).hexdigest()[:16]
+        version = hashlib.md5(f"{self.signature}".encode('utf-8')).hexdigest()[:16]
+        extension = 'jpg' if quality else 'png'
+        prefix = f"bg{source}-"
+        os.makedirs(cache_folder, exist_ok=True)
+        self.path = os.path.join(cache_folder, f"{prefix}{version}.{extension}")
+        if os.path.exists(self.path):
+            return
+
+        with Image.open(image_path) as im:
+            im.load()
+
+            # Downscale to the highest resolution the page can use
+            max_width = int(page_size[0] * max_dpi / 72)
+            max_height = int(page_size[1] * max_dpi / 72)
+            if im.width > max_width or im.height > max_height:
+                im = im.copy()
+                im.thumbnail((max_width, max_height), Image.LANCZOS)
+
+            # The background is drawn first on a blank page, so transparent
+            # parts show white either way
+            if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+                im = im.convert('RGBA')
+                flattened = Image.new('RGB', im.size, 'white')
+                flattened.paste(im, mask=im.getchannel('A'))
+                im = flattened
+
+            # Render workers may build the same file at once; each writes its
+            # own temporary file and the last rename wins
+            temporary = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            if quality:
+                im.convert('RGB').save(temporary, 'JPEG', quality=quality, subsampling=0)
+            else:
+                im.convert('RGB').save(temporary, 'PNG')
+            os.replace(temporary, self.path)
+
+        # Earlier versions of the same image are no longer drawn
+        for name in os.listdir(cache_folder):
+            if name.startswith(prefix) and name != os.path.basename(self.path):
+                try:
+                    os.remove(os.path.join(cache_folder, name))
+                except OSError:
+                    pass
+
+    def is_current(self):
+        """Check whether the image file is unchanged since it was cached"""
+        try:
+            stat = os.stat(self.image_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == self.signature and os.path.exists(self.path)
+
+    def draw(self, c, x, y, width, height):
+        """Draw the cached image on a canvas; ReportLab embeds it once per document"""
+        c.drawImage(self.path, x, y, width=width, height=height)
+
+
+# Background templates cached per process, keyed by image path and page size
+_background_cache = {}
+
+
+def get_background_template(image_path, page_size):
+    """Return the cached BackgroundTemplate for image_path, rebuilding it if the file changed"""
+    key = (image_path, tuple(page_size))
+    template = _background_cache.get(key)
+    if template is None or not template.is_current():
+        quality = int(BACKGROUND_JPEG_QUALITY) if BACKGROUND_JPEG_QUALITY else None
+        template = BackgroundTemplate(image_path, page_size, quality=quality)
+        _background_cache[key] = template
+        logger.info(f"Cached background template: {image_path}")
+    return template
+
+
+# Bump whenever the certificate layout changes so cached PDFs are re-rendered
+GENERATOR_VERSION = '1'
+
+# File content digests cached per process, keyed by path
+_file_digests = {}
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file, recomputed only when the file changes"""
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_digests.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    _file_digests[path] = (signature, digest.hexdigest())
+    return _file_digests[path][1]
+
+
+def _stable_qr_content(qr_payload):
+    """Return the QR payload without the per-call generated_at timestamp"""
+    try:
+        data = json.loads(qr_payload)
+    except (TypeError, ValueError):
+        return qr_payload
+    if isinstance(data, dict):
+        data.pop('generated_at', None)
+    return json.dumps(data, sort_keys=True)
+
+
+def certificate_fingerprint(student, background_image_path, qr_code_path=None, qr_payload=None,
+                            qr_render_mode='image'):
+    """Fingerprint a certificate from its rendered fields, background, QR content and generator version"""
+    record = StudentRecord.from_student(student)
+    fields = {
+        field: value.isoformat() if hasattr(value, 'isoformat') else value
+        for field, value in ((field, getattr(record, field)) for field in StudentRecord.FIELDS)
+    }
+    if qr_payload:
+        qr = {'payload': _stable_qr_content(qr_payload), 'mode': qr_render_mode}
+    elif qr_code_path and os.path.exists(qr_code_path):
+        qr = {'image': file_digest(qr_code_path)}
+    else:
+        qr = None
+
+    content = {
+        'version': GENERATOR_VERSION,
+        'fields': fields,
+        'background': file_digest(background_image_path),
+        'qr': qr
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class StudentRecord:
+    """Lightweight, picklable copy of the student fields used when rendering"""
+
+    FIELDS = (
+        'student_name', 'certificate_id', 'roll_number', 'college_name',
+        'internship_name', 'internship_start_date', 'internship_end_date',
+        'duration_weeks', 'mentor_name', 'company_name', 'performance_rating'
+    )
+
+    def __init__(self, **fields):
+        for field in self.FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_student(cls, student):
+        """Copy the rendered fields from a Student model or any similar object"""
+        if isinstance(student, cls):
+            return student
+        return cls(**{field: getattr(student, field, None) for field in cls.FIELDS})
+
+
+# Generators reused by every render inside a worker process, keyed by QR render mode
+_worker_generators = {}
+
+
+def _render_in_worker(record, background_image_path, qr_code_path, qr_payload=None, qr_render_mode='image'):
+    """Render one certificate inside a ProcessPoolExecutor worker
+
+    Returns the certificate path and the metrics events recorded while
+    rendering, for the parent process to replay.
+    """
+    generator = _worker_generators.get(qr_render_mode)
+    if generator is None:
+        generator = _worker_generators[qr_render_mode] = CertificateGenerator(qr_render_mode)
+    with metrics.capture() as events:
+        path = generator.render_with_payload(record, background_image_path, qr_code_path, qr_payload)
+    return path, events
+
 # Define a dummy Student class to simulate student data for certificate generation
 class Student:
     def __init__(self, student_name, certificate_id, roll_number, college_name,
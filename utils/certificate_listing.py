@@ -0,0 +1,209 @@
+import re
+import logging
+from flask import jsonify, request
+from sqlalchemy import text, or_
+from app import app, db
+from models import Student, CertificateStatus
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'student_search'
+
+# External-content FTS5 index over the searchable student columns. The
+# triggers keep it in sync with every insert, update and delete on the
+# student table, including bulk inserts that bypass the ORM.
+SEARCH_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        student_name, roll_number, certificate_id, email,
+        content='student', content_rowid='id', tokenize="unicode61 tokenchars '-_/'"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS student_search_insert AFTER INSERT ON student BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, student_name, roll_number, certificate_id, email)
+        VALUES (new.id, new.student_name, new.roll_number, new.certificate_id, new.email);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS student_search_delete AFTER DELETE ON student BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, student_name, roll_number, certificate_id, email)
+        VALUES ('delete', old.id, old.student_name, old.roll_number, old.certificate_id, old.email);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS student_search_update AFTER UPDATE OF
+        student_name, roll_number, certificate_id, email ON student BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, student_name, roll_number, certificate_id, email)
+        VALUES ('delete', old.id, old.student_name, old.roll_number, old.certificate_id, old.email);
+        INSERT INTO {SEARCH_TABLE}(rowid, student_name, roll_number, certificate_id, email)
+        VALUES (new.id, new.student_name, new.roll_number, new.certificate_id, new.email);
+    END""",
+]
+
+FILTER_COLUMNS = {
+    'college': Student.college_name,
+    'branch': Student.branch,
+    'internship': Student.internship_name,
+}
+
+
+def student_summary(student):
+    """Return the JSON row shown for a student on the certificates screen"""
+    return {
+        'id': student.id,
+        'student_name': student.student_name,
+        'roll_number': student.roll_number,
+        'email': student.email,
+        'college_name': student.college_name,
+        'branch': student.branch,
+        'internship_name': student.internship_name,
+        'company_name': student.company_name,
+        'internship_start_date': student.internship_start_date.isoformat() if student.internship_start_date else None,
+        'internship_end_date': student.internship_end_date.isoformat() if student.internship_end_date else None,
+        'duration_weeks': student.duration_weeks,
+        'certificate_id': student.certificate_id,
+        'date_of_issue': student.date_of_issue.isoformat() if student.date_of_issue else None,
+        'certificate_status': student.certificate_status.value if student.certificate_status else None
+    }
+
+
+class CertificateListing:
+    """Keyset-paginated, filterable and searchable listing of students
+
+    Pages are ordered newest first by student id and continue from the last
+    id of the previous page (the cursor), so every page costs the same no
+    matter how deep the operator scrolls. Search uses the student_search
+    FTS5 index on SQLite and falls back to LIKE matching elsewhere.
+    """
+
+    def __init__(self, default_limit=50, max_limit=200):
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self._search_ready = None
+
+    def init_search_index(self):
+        """Create the FTS5 index and its triggers, filling it from existing students"""
+        if db.engine.dialect.name != 'sqlite':
+            self._search_ready = False
+            return False
+
+        with db.engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': SEARCH_TABLE}
+            ).first()
+            try:
+                for statement in SEARCH_SCHEMA:
+                    connection.execute(text(statement))
+            except Exception as e:
+                logger.warning(f"Full-text search unavailable, falling back to LIKE search: {str(e)}")
+                self._search_ready = False
+                return False
+            if not exists:
+                connection.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+                logger.info(f"Built {SEARCH_TABLE} full-text index")
+
+        self._search_ready = True
+        return True
+
+    def search_ready(self):
+        if self._search_ready is None:
+            self.init_search_index()
+        return self._search_ready
+
+    def page(self, status=None, college=None, branch=None, internship=None, search=None,
+             cursor=None, limit=None):
+        """Return one page of students as {'items', 'next_cursor', 'has_more', 'total'}
+
+        cursor is the next_cursor of the previous page. total is only filled
+        in when it can be read from the dashboard counters (no filters, or a
+        status filter alone); counting other filtered sets would cost a scan.
+        """
+        limit = max(1, min(int(limit or self.default_limit), self.max_limit))
+        query = self.filtered_query(status, college, branch, internship, search)
+        if cursor:
+            query = query.filter(Student.id < int(cursor))
+
+        # One extra row tells whether another page follows
+        students = query.order_by(Student.id.desc()).limit(limit + 1).all()
+        has_more = len(students) > limit
+        students = students[:limit]
+
+        return {
+            'items': [student_summary(student) for student in students],
+            'next_cursor': students[-1].id if has_more else None,
+            'has_more': has_more,
+            'total': self._counted_total(status, college, branch, internship, search)
+        }
+
+    def filter_options(self):
+        """Return the distinct colleges, branches and internships for the filter dropdowns"""
+        return {
+            name: [value for (value,) in db.session.query(column).distinct().order_by(column) if value]
+            for name, column in FILTER_COLUMNS.items()
+        }
+
+    def filtered_query(self, status=None, college=None, branch=None, internship=None, search=None):
+        """Return the Student query for the listing filters, without ordering or paging"""
+        query = Student.query
+        if status:
+            query = query.filter(Student.certificate_status == CertificateStatus(status))
+        for name, value in (('college', college), ('branch', branch), ('internship', internship)):
+            if value:
+                query = query.filter(FILTER_COLUMNS[name] == value)
+
+        search = (search or '').strip()
+        if search:
+            match = self._match_expression(search)
+            if match and self.search_ready():
+                query = query.filter(Student.id.in_(
+                    text(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match")
+                    .bindparams(match=match)
+                    .columns(db.column('rowid', db.Integer))
+                ))
+            else:
+                pattern = f"%{search}%"
+                query = query.filter(or_(
+                    Student.student_name.ilike(pattern),
+                    Student.roll_number.ilike(pattern),
+                    Student.email.ilike(pattern),
+                    Student.certificate_id.ilike(pattern)
+                ))
+        return query
+
+    def _match_expression(self, search):
+        """Turn operator input into an FTS5 query matching every term as a prefix"""
+        terms = re.findall(r"[\w@.\-/]+", search)
+        return ' '.join('"' + term.replace('"', '') + '"*' for term in terms)
+
+    def _counted_total(self, status, college, branch, internship, search):
+        if college or branch or internship or (search or '').strip():
+            return None
+        from utils.dashboard_stats import dashboard_stats
+        stats, _ = dashboard_stats.snapshot()
+        if not status:
+            return stats['total_students']
+        return next(
+            (row['count'] for row in stats['status_distribution'] if row['status'] == status), 0
+        )
+
+
+certificate_listing = CertificateListing(
+    default_limit=app.config.get('CERTIFICATES_PAGE_SIZE', 50)
+)
+
+
+def certificates_api_response():
+    """Build the JSON response for the certificates listing API from request.args
+
+    Accepts status, college, branch, internship, search, cursor and limit.
+    """
+    args = request.args
+    try:
+        result = certificate_listing.page(
+            status=args.get('status') or None,
+            college=args.get('college') or None,
+            branch=args.get('branch') or None,
+            internship=args.get('internship') or None,
+            search=args.get('search') or None,
+            cursor=args.get('cursor') or None,
+            limit=args.get('limit') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': f"Invalid listing parameter: {str(e)}"}), 400
+    return jsonify(result)
+
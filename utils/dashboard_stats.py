@@ -0,0 +1,254 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from flask import jsonify, request
+from app import db
+from models import Student, Certificate, CertificateVerification, CertificateStatus
+
+logger = logging.getLogger(__name__)
+
+INITIALIZED = 'initialized'
+STUDENTS = 'students'
+CERTIFICATES = 'certificates'
+VERIFICATIONS = 'verifications'
+STATUS_PREFIX = 'status:'
+GENERATED_PREFIX = 'generated:'
+
+
+class DashboardCounter(db.Model):
+    """A named running total behind /api/dashboard_stats"""
+    __tablename__ = 'dashboard_counter'
+
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+
+
+class DashboardStats:
+    """Dashboard counters maintained incrementally as rows change
+
+    Every ORM flush that inserts students, certificates or verifications, or
+    changes a student's status, adds its deltas to the dashboard_counter
+    table in the same transaction (see _collect_deltas). Reading the stats
+    is then a scan of a few dozen counter rows instead of aggregate queries
+    over the data tables, and the result is also cached in-process for
+    cache_ttl seconds. Bulk inserts that bypass the ORM report their counts
+    with add().
+    """
+
+    def __init__(self, cache_ttl=5, days=30):
+        self.cache_ttl = cache_ttl
+        self.days = days
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_until = 0
+        self._table_ready = None
+
+    def table_ready(self):
+        """Return whether the dashboard_counter table exists, checking the database once"""
+        if self._table_ready is None:
+            self._table_ready = inspect(db.engine).has_table(DashboardCounter.__tablename__)
+        return self._table_ready
+
+    def init_table(self):
+        """Create the dashboard_counter table, seed it and start counting this process's flushes"""
+        register_listeners()
+        DashboardCounter.__table__.create(db.engine, checkfirst=True)
+        self._table_ready = True
+        if not DashboardCounter.query.get(INITIALIZED):
+            self.rebuild()
+
+    def rebuild(self):
+        """Recount every counter from the data tables
+
+        This is the only O(rows) operation; run it once to seed the counters
+        or to repair them after data was changed outside the ORM.
+        """
+        counters = {
+            STUDENTS: Student.query.count(),
+            CERTIFICATES: Certificate.query.count(),
+            VERIFICATIONS: CertificateVerification.query.count(),
+        }
+        for status, count in db.session.query(Student.certificate_status, func.count(Student.id)).group_by(
+            Student.certificate_status
+        ):
+            if status:
+                counters[STATUS_PREFIX + status.name] = count
+        for day, count in db.session.query(
+            func.date(Certificate.generation_time), func.count(Certificate.id)
+        ).group_by(func.date(Certificate.generation_time)):
+            if day:
+                counters[GENERATED_PREFIX + str(day)] = count
+        counters[INITIALIZED] = 1
+
+        DashboardCounter.query.delete()
+        db.session.add_all(DashboardCounter(name=name, value=value) for name, value in counters.items())
+        db.session.commit()
+        self.invalidate()
+        logger.info(f"Rebuilt {len(counters)} dashboard counters")
+
+    def add(self, deltas, connection=None):
+        """Add deltas ({counter name: amount}) to the counters inside the current transaction"""
+        deltas = {name: amount for name, amount in deltas.items() if amount}
+        if not deltas or not self.table_ready():
+            return
+
+        connection = connection or db.session.connection()
+        dialect = connection.dialect.name
+        for name, amount in deltas.items():
+            if dialect in ('sqlite', 'postgresql'):
+                insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(DashboardCounter)
+                statement = insert.values(name=name, value=amount).on_conflict_do_update(
+                    index_elements=[DashboardCounter.name],
+                    set_={'value': DashboardCounter.value + amount}
+                )
+                connection.execute(statement)
+            else:
+                updated = connection.execute(
+                    DashboardCounter.__table__.update()
+                    .where(DashboardCounter.name == name)
+                    .values(value=DashboardCounter.value + amount)
+                ).rowcount
+                if not updated:
+                    connection.execute(DashboardCounter.__table__.insert().values(name=name, value=amount))
+
+    def invalidate(self):
+        """Drop the in-process snapshot so the next read goes to the counters"""
+        with self._lock:
+            self._cached = None
+            self._cached_until = 0
+
+    def snapshot(self):
+        """Return (stats, etag) for the dashboard, served from cache within cache_ttl"""
+        with self._lock:
+            if self._cached and time.monotonic() < self._cached_until:
+                return self._cached
+
+        counters = {row.name: row.value for row in DashboardCounter.query.all()} if self.table_ready() else {}
+        if INITIALIZED not in counters:
+            self.init_table()
+            counters = {row.name: row.value for row in DashboardCounter.query.all()}
+        stats = self._build_stats(counters)
+        etag = hashlib.sha1(json.dumps(stats, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+        with self._lock:
+            self._cached = (stats, etag)
+            self._cached_until = time.monotonic() + self.cache_ttl
+        return stats, etag
+
+    def response(self):
+        """Build the /api/dashboard_stats response, answering 304 when the ETag matches"""
+        stats, etag = self.snapshot()
+        response = jsonify(stats)
+        response.set_etag(etag)
+        # Browsers revalidate on every poll and get an empty 304 while nothing changed
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    def _build_stats(self, counters):
+        status_counts = {
+            status: counters.get(STATUS_PREFIX + status.name, 0) for status in CertificateStatus
+        }
+        total_students = counters.get(STUDENTS, 0)
+        sent = status_counts[CertificateStatus.SENT]
+
+        days = sorted(
+            (name[len(GENERATED_PREFIX):], value) for name, value in counters.items()
+            if name.startswith(GENERATED_PREFIX) and value
+        )[-self.days:]
+
+        return {
+            'total_students': total_students,
+            'total_certificates': counters.get(CERTIFICATES, 0),
+            'total_verifications': counters.get(VERIFICATIONS, 0),
+            'pending_certificates': status_counts[CertificateStatus.PENDING],
+            'generated_certificates': status_counts[CertificateStatus.GENERATED],
+            'sent_certificates': sent,
+            'failed_certificates': status_counts[CertificateStatus.FAILED],
+            'success_rate': round(sent / total_students * 100, 1) if total_students > 0 else 0,
+            'daily_generation': [{'date': day, 'count': count} for day, count in days],
+            'status_distribution': [
+                {'status': status.value, 'count': count} for status, count in status_counts.items() if count
+            ]
+        }
+
+
+dashboard_stats = DashboardStats()
+
+
+def _status_key(status):
+    return STATUS_PREFIX + status.name if status else None
+
+
+def _collect_deltas(session):
+    """Work out the counter changes made by the objects in a flush"""
+    deltas = {}
+
+    def bump(name, amount):
+        if name:
+            deltas[name] = deltas.get(name, 0) + amount
+
+    for obj in session.new:
+        if isinstance(obj, Student):
+            bump(STUDENTS, 1)
+            bump(_status_key(obj.certificate_status or CertificateStatus.PENDING), 1)
+        elif isinstance(obj, Certificate):
+            bump(CERTIFICATES, 1)
+            generated = obj.generation_time or datetime.utcnow()
+            bump(GENERATED_PREFIX + generated.date().isoformat(), 1)
+        elif isinstance(obj, CertificateVerification):
+            bump(VERIFICATIONS, 1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Student):
+            history = inspect(obj).attrs.certificate_status.history
+            if history.has_changes():
+                for status in history.deleted:
+                    bump(_status_key(status), -1)
+                for status in history.added:
+                    bump(_status_key(status), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Student):
+            bump(STUDENTS, -1)
+            bump(_status_key(obj.certificate_status), -1)
+        elif isinstance(obj, Certificate):
+            bump(CERTIFICATES, -1)
+            if obj.generation_time:
+                bump(GENERATED_PREFIX + obj.generation_time.date().isoformat(), -1)
+        elif isinstance(obj, CertificateVerification):
+            bump(VERIFICATIONS, -1)
+
+    return deltas
+
+
+def _load_previous_status(target, value, oldvalue, initiator):
+    # active_history makes SQLAlchemy load the old status before it is
+    # replaced, so the flush can decrement the right counter
+    return value
+
+
+def _update_counters_after_flush(session, flush_context):
+    if not dashboard_stats.table_ready():
+        return
+    deltas = _collect_deltas(session)
+    if deltas:
+        dashboard_stats.add(deltas, connection=session.connection())
+
+
+def register_listeners():
+    """Keep the counters current from every ORM flush in this process
+
+    Every process that writes students, certificates or verifications must
+    call this; init_table() and JobQueue.start() do. Calling it again is a
+    no-op.
+    """
+    if event.contains(Session, 'after_flush', _update_counters_after_flush):
+        return
+    event.listen(Student.certificate_status, 'set', _load_previous_status, active_history=True)
+    event.listen(Session, 'after_flush', _update_counters_after_flush)
@@ -0,0 +1,160 @@
+import logging
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+logger = logging.getLogger(__name__)
+
+# Accepted upload date formats; earlier formats win when a value fits several
+DATE_FORMATS = [
+    '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
+    '%Y/%m/%d', '%d.%m.%Y', '%m.%d.%Y', '%Y.%m.%d'
+]
+
+# Day-first and month-first formats that read days 1-12 both ways
+AMBIGUOUS_FORMATS = {
+    '%d/%m/%Y': '%m/%d/%Y', '%m/%d/%Y': '%d/%m/%Y',
+    '%d-%m-%Y': '%m-%d-%Y', '%m-%d-%Y': '%d-%m-%Y',
+    '%d.%m.%Y': '%m.%d.%Y', '%m.%d.%Y': '%d.%m.%Y',
+}
+
+
+def describe_format(date_format):
+    """Return a date format in the DD/MM/YYYY style shown to users"""
+    return date_format.replace('%d', 'DD').replace('%m', 'MM').replace('%Y', 'YYYY')
+
+
+def _as_date(value):
+    """Return value as a datetime.date if it is already a date cell, else None"""
+    # Spreadsheet cells often arrive as date objects already; numpy values
+    # from datetime64 columns are not datetime instances until converted
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _mapped(series, lookup):
+    """Map series through lookup, leaving None (not NaN) where there is no entry"""
+    if not lookup:
+        return pd.Series([None] * len(series), index=series.index, dtype=object)
+    mapped = series.map(lookup).astype(object)
+    return mapped.where(mapped.notna(), None)
+
+
+class DateColumnParser:
+    """Parse upload date columns with one vectorized pass per column
+
+    The dominant format of a column is detected from a sample of its
+    distinct values, then every distinct value is parsed at once with
+    pd.to_datetime(format=...). Values that do not fit the column's format
+    fall back to trying each of DATE_FORMATS, memoized by raw string.
+    """
+
+    def __init__(self, formats=DATE_FORMATS, sample_size=500, memo_size=50000):
+        self.formats = formats
+        self.sample_size = sample_size
+        self.memo_size = memo_size
+        self._memo = {}
+
+    def detect_format(self, values):
+        """Return (format, alternative) for the dominant format of some raw date strings
+
+        format is None when no sampled value fits any format. alternative is
+        the month-first/day-first counterpart when every sampled value reads
+        equally well both ways, and None otherwise.
+        """
+        # Only text needs a format; date cells are taken as they are
+        strings = [value for value in pd.Series(values, dtype=object).dropna() if isinstance(value, str)]
+        sample = pd.Series(pd.unique(pd.Series(strings, dtype=object).str.strip()), dtype=object)
+        sample = sample[sample != ''][:self.sample_size]
+        if sample.empty:
+            return None, None
+
+        counts = {
+            date_format: int(pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum())
+            for date_format in self.formats
+        }
+        best = max(self.formats, key=lambda date_format: (counts[date_format], -self.formats.index(date_format)))
+        if not counts[best]:
+            return None, None
+
+        alternative = AMBIGUOUS_FORMATS.get(best)
+        if alternative is None or counts[alternative] < counts[best]:
+            return best, None
+        return best, alternative
+
+    def parse(self, series, date_format=None):
+        """Parse a column of dates, returning (dates, errors) Series aligned with the input
+
+        dates holds datetime.date objects (None for blanks and failures);
+        errors holds the message for each value that could not be parsed.
+        date_format skips detection when the column's format is known.
+        Each distinct raw value is converted once and mapped back onto the column.
+        """
+        if is_datetime64_any_dtype(series):
+            # A column of spreadsheet date cells needs no parsing at all
+            dates = series.dt.date.astype(object)
+            return dates.where(series.notna(), None), _mapped(series, {})
+
+        values = series[series.notna()]
+
+        parsed_dates = {}
+        parse_errors = {}
+        raw_strings = {}
+        for raw in pd.unique(values):
+            parsed = _as_date(raw)
+            if parsed is not None:
+                parsed_dates[raw] = parsed
+            else:
+                raw_strings[raw] = str(raw).strip()
+
+        if raw_strings:
+            distinct = pd.Series(list(raw_strings.values()), dtype=object)
+            date_format = date_format or self.detect_format(distinct)[0]
+            if date_format:
+                parsed = pd.to_datetime(distinct, format=date_format, errors='coerce')
+            else:
+                parsed = pd.Series(pd.NaT, index=distinct.index)
+
+            for raw, timestamp in zip(raw_strings, parsed):
+                if pd.notna(timestamp):
+                    parsed_dates[raw] = timestamp.date()
+                    continue
+                # Outliers from the column's format get the per-value fallback
+                try:
+                    parsed_dates[raw] = self.parse_value(raw)
+                except ValueError as e:
+                    parse_errors[raw] = str(e)
+
+        return _mapped(series, parsed_dates), _mapped(series, parse_errors)
+
+    def parse_value(self, value):
+        """Parse a single date value trying each format in turn, memoizing raw strings"""
+        if pd.isna(value):
+            return None
+        parsed = _as_date(value)
+        if parsed is not None:
+            return parsed
+
+        raw = str(value).strip()
+        if raw not in self._memo:
+            if len(self._memo) >= self.memo_size:
+                self._memo.clear()
+            self._memo[raw] = self._parse_string(raw)
+        parsed = self._memo[raw]
+        if parsed is None:
+            raise ValueError(f"Unable to parse date: {value}")
+        return parsed
+
+    def _parse_string(self, raw):
+        for date_format in self.formats:
+            try:
+                return datetime.strptime(raw, date_format).date()
+            except ValueError:
+                continue
+        return None
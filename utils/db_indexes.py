@@ -0,0 +1,166 @@
+import sys
+import logging
+from datetime import datetime
+from sqlalchemy import func, select, text
+from app import app, db
+from models import Student, Certificate, CertificateVerification, CertificateStatus
+
+logger = logging.getLogger(__name__)
+
+# Indexes for the hot lookups: duplicate checks during upload, dashboard
+# counts, certificates listing filters, certificate lookups per student and
+# verification history. Declaring them on the model tables means
+# db.create_all() builds them for new databases; migrate() adds them to
+# existing ones.
+STUDENT_ROLL_NUMBER_INDEX = db.Index('ix_student_roll_number', Student.roll_number, unique=True)
+
+INDEXES = [
+    STUDENT_ROLL_NUMBER_INDEX,
+    db.Index('ix_student_email', Student.email),
+    db.Index('ix_student_certificate_status', Student.certificate_status),
+    db.Index('ix_student_college_status', Student.college_name, Student.certificate_status),
+    db.Index('ix_student_created_at', Student.created_at),
+    db.Index('ix_student_branch', Student.branch),
+    db.Index('ix_student_internship_name', Student.internship_name),
+    db.Index('ix_certificate_student_id', Certificate.student_id),
+    db.Index('ix_certificate_generation_time', Certificate.generation_time),
+    db.Index('ix_verification_student_id', CertificateVerification.student_id),
+    db.Index('ix_verification_certificate_time',
+             CertificateVerification.certificate_id, CertificateVerification.verification_time),
+    db.Index('ix_verification_time', CertificateVerification.verification_time),
+]
+
+
+def migrate():
+    """Create any missing indexes on an existing database
+
+    Every index is created with checkfirst, so running this repeatedly is
+    safe. The roll number index is unique because uploads reject duplicate
+    roll numbers; if an older database already holds duplicates it is
+    created as a plain index instead and the duplicates are logged.
+    Returns the names of the indexes that were created.
+    """
+    created = []
+    existing = {
+        index['name']
+        for table in ('student', 'certificate', 'certificate_verification')
+        for index in db.inspect(db.engine).get_indexes(table)
+    }
+
+    for index in INDEXES:
+        if index.name in existing:
+            continue
+
+        if index is STUDENT_ROLL_NUMBER_INDEX:
+            duplicates = db.session.query(Student.roll_number).group_by(
+                Student.roll_number
+            ).having(func.count(Student.id) > 1).limit(10).all()
+            if duplicates:
+                logger.warning(
+                    f"Duplicate roll numbers found ({', '.join(row.roll_number for row in duplicates)}); "
+                    f"creating {index.name} as a non-unique index"
+                )
+                with db.engine.begin() as connection:
+                    connection.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS {index.name} ON student (roll_number)"
+                    ))
+                created.append(index.name)
+                continue
+
+        index.create(db.engine, checkfirst=True)
+        created.append(index.name)
+        logger.info(f"Created index {index.name}")
+
+    # End the session's read transaction so later queries see the new indexes
+    db.session.commit()
+
+    if created:
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'sqlite':
+                connection.execute(text('ANALYZE'))
+        # Pooled SQLite connections can keep planning with the old schema
+        db.engine.dispose()
+    return created
+
+
+def hot_queries():
+    """Return (name, statement, expected index) for the queries the indexes exist for"""
+    now = datetime.utcnow()
+    return [
+        ('duplicate roll number check',
+         select(Student.id).where(Student.roll_number == 'ROLL-1'),
+         'ix_student_roll_number'),
+        ('bulk roll number check',
+         select(Student.roll_number).where(Student.roll_number.in_(['ROLL-1', 'ROLL-2'])),
+         'ix_student_roll_number'),
+        ('students by email',
+         select(Student.id).where(Student.email == 'student@example.com'),
+         'ix_student_email'),
+        ('status distribution',
+         select(Student.certificate_status, func.count(Student.id)).group_by(Student.certificate_status),
+         'ix_student_certificate_status'),
+        ('students by college and status',
+         select(Student.id).where(Student.college_name == 'College',
+                                  Student.certificate_status == CertificateStatus.PENDING),
+         'ix_student_college_status'),
+        ('students by branch',
+         select(Student.id).where(Student.branch == 'Branch').order_by(Student.id.desc()).limit(50),
+         'ix_student_branch'),
+        ('students by internship',
+         select(Student.id).where(Student.internship_name == 'Internship').order_by(Student.id.desc()).limit(50),
+         'ix_student_internship_name'),
+        ('latest certificate for student',
+         select(Certificate.id).where(Certificate.student_id == 1).order_by(Certificate.id.desc()).limit(1),
+         'ix_certificate_student_id'),
+        ('daily generation',
+         select(func.date(Certificate.generation_time), func.count(Certificate.id))
+         .where(Certificate.generation_time >= now).group_by(func.date(Certificate.generation_time)),
+         'ix_certificate_generation_time'),
+        ('verifications for certificate',
+         select(CertificateVerification.id).where(CertificateVerification.certificate_id == 'CERT-1')
+         .order_by(CertificateVerification.verification_time.desc()),
+         'ix_verification_certificate_time'),
+        ('verifications for student',
+         select(CertificateVerification.id).where(CertificateVerification.student_id == 1),
+         'ix_verification_student_id'),
+        ('recent verifications',
+         select(func.count(CertificateVerification.id)).where(CertificateVerification.verification_time >= now),
+         'ix_verification_time'),
+    ]
+
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN on each hot query and report whether it uses its index
+
+    Returns a list of dicts with name, expected_index, uses_index and plan,
+    or an empty list when the database is not SQLite.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        logger.warning("Query plan check only supports SQLite")
+        return []
+
+    results = []
+    for name, statement, expected_index in hot_queries():
+        sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        results.append({
+            'name': name,
+            'expected_index': expected_index,
+            'uses_index': any(f"INDEX {expected_index}" in detail for detail in plan),
+            'plan': plan
+        })
+    return results
+
+
+if __name__ == "__main__":
+    # Apply the indexes and verify the hot query plans: python -m utils.db_indexes
+    with app.app_context():
+        for index_name in migrate():
+            print(f"Created {index_name}")
+
+        failures = 0
+        for result in check_query_plans():
+            status = 'ok' if result['uses_index'] else 'FULL SCAN'
+            print(f"{status:9} {result['name']}: {'; '.join(result['plan'])}")
+            failures += not result['uses_index']
+        sys.exit(1 if failures else 0)
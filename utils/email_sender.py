@@ -1,5 +1,13 @@
 from flask_mail import Message
 from app import mail, app
+from utils.bulk_mailer import BulkMailer, StreamedMessage, send_streamed
+from utils.metrics import metrics, SMTP_SEND
+from functools import partial
+from email.utils import formataddr, formatdate, make_msgid
+import email.policy
+import base64
+import tempfile
+import uuid
 import os
 import logging
 from email.mime.multipart import MIMEMultipart
@@ -10,94 +18,54 @@ import smtplib
 
 logger = logging.getLogger(__name__)
 
-class EmailSender:
-    """Handle email delivery for certificates"""
-    
-    def __init__(self):
-        self.sender_email = app.config['MAIL_DEFAULT_SENDER']
-        self.sender_name = "Certificate System"
-    
-    def send_certificate_email(self, student, certificate_path):
-        """Send certificate email to student"""
-        try:
-            # Create email subject
-            subject = f"Internship Certificate - {student.internship_name}"
-            
-            # Create email body
-            body = self._create_email_body(student)
-            
-            # Create message
-            msg = Message(
-                subject=subject,
-                sender=(self.sender_name, self.sender_email),
-                recipients=[student.email]
-            )
-            
-            msg.html = body
-            
-            # Attach certificate if file exists
-            if certificate_path and os.path.exists(certificate_path):
-                with app.open_resource(certificate_path) as fp:
-                    msg.attach(
-                        filename=f"certificate_{student.certificate_id}.pdf",
-                        content_type="application/pdf",
-                        data=fp.read()
-                    )
-            
-            # Send email
-            mail.send(msg)
-            
-            logger.info(f"Certificate email sent successfully to {student.email}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending certificate email to {student.email}: {str(e)}")
-            return False
-    
-    def _create_email_body(self, student):
-        """Create personalized email body"""
-        body = f"""
+# Bytes of PDF base64-encoded per write; a multiple of 57 so every chunk
+# encodes to whole 76-character lines
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
+# The certificate email body is split once into static text and the small
+# templates holding per-student fields, so each message only formats those
+_EMAIL_HEAD = """
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <title>Internship Certificate</title>
             <style>
-                body {{
+                body {
                     font-family: Arial, sans-serif;
                     line-height: 1.6;
                     color: #333;
                     max-width: 600px;
                     margin: 0 auto;
                     padding: 20px;
-                }}
-                .header {{
+                }
+                .header {
                     background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                     color: white;
                     padding: 30px 20px;
                     text-align: center;
                     border-radius: 10px 10px 0 0;
-                }}
-                .content {{
+                }
+                .content {
                     background: #f8f9fa;
                     padding: 30px 20px;
                     border-radius: 0 0 10px 10px;
-                }}
-                .highlight {{
+                }
+                .highlight {
                     background: #e3f2fd;
                     padding: 15px;
                     border-left: 4px solid #2196f3;
                     margin: 20px 0;
-                }}
-                .footer {{
+                }
+                .footer {
                     text-align: center;
                     margin-top: 30px;
                     padding-top: 20px;
                     border-top: 1px solid #ddd;
                     color: #666;
                     font-size: 12px;
-                }}
-                .btn {{
+                }
+                .btn {
                     display: inline-block;
                     background: #2196f3;
                     color: white;
@@ -105,7 +73,7 @@ class EmailSender:
                     text-decoration: none;
                     border-radius: 5px;
                     margin: 10px 0;
-                }}
+                }
             </style>
         </head>
         <body>
@@ -115,40 +83,38 @@ class EmailSender:
             </div>
             
             <div class="content">
-                <p>Dear <strong>{student.student_name}</strong>,</p>
+"""
+
+_EMAIL_DETAILS = """                <p>Dear <strong>{student_name}</strong>,</p>
                 
                 <p>Congratulations on successfully completing your internship program! We are pleased to inform you that your certificate has been generated and is attached to this email.</p>
                 
                 <div class="highlight">
                     <h3>Internship Details:</h3>
                     <ul>
-                        <li><strong>Program:</strong> {student.internship_name}</li>
-                        <li><strong>Duration:</strong> {student.internship_start_date.strftime('%B %d, %Y')} to {student.internship_end_date.strftime('%B %d, %Y')}</li>
-                        <li><strong>Certificate ID:</strong> {student.certificate_id}</li>
-                        <li><strong>College:</strong> {student.college_name}</li>
-                        <li><strong>Branch:</strong> {student.branch}</li>
+                        <li><strong>Program:</strong> {internship_name}</li>
+                        <li><strong>Duration:</strong> {start_date} to {end_date}</li>
+                        <li><strong>Certificate ID:</strong> {certificate_id}</li>
+                        <li><strong>College:</strong> {college_name}</li>
+                        <li><strong>Branch:</strong> {branch}</li>
         """
-        
-        if student.mentor_name:
-            body += f"                        <li><strong>Mentor:</strong> {student.mentor_name}</li>\n"
-        
-        if student.company_name:
-            body += f"                        <li><strong>Company:</strong> {student.company_name}</li>\n"
-        
-        if student.performance_rating:
-            body += f"                        <li><strong>Performance Rating:</strong> {student.performance_rating}</li>\n"
-        
-        body += f"""
+
+_EMAIL_OPTIONAL_LINE = """                        <li><strong>{label}:</strong> {value}</li>
+"""
+
+_EMAIL_CLOSING = """
                     </ul>
                 </div>
                 
-                <p>Your certificate is attached as a PDF file. You can also verify your certificate online using the certificate ID: <strong>{student.certificate_id}</strong></p>
+                <p>Your certificate is attached as a PDF file. You can also verify your certificate online using the certificate ID: <strong>{certificate_id}</strong></p>
                 
                 <p style="text-align: center;">
-                    <a href="https://your-domain.com/certificate/{student.certificate_id}" class="btn">Verify Certificate Online</a>
+                    <a href="https://your-domain.com/certificate/{certificate_id}" class="btn">Verify Certificate Online</a>
                 </p>
                 
-                <p><strong>Important Notes:</strong></p>
+"""
+
+_EMAIL_FOOTER = """                <p><strong>Important Notes:</strong></p>
                 <ul>
                     <li>Keep this certificate safe as it serves as proof of your successful completion</li>
                     <li>The QR code on the certificate can be scanned for instant verification</li>
@@ -168,34 +134,148 @@ class EmailSender:
         </body>
         </html>
         """
+
+
+class EmailSender:
+    """Handle email delivery for certificates"""
+    
+    def __init__(self):
+        self.sender_email = app.config['MAIL_DEFAULT_SENDER']
+        self.sender_name = "Certificate System"
+    
+    def write_certificate_message(self, fp, student, certificate_path):
+        """Write the certificate email for a student as MIME to a binary file
+        
+        The PDF attachment is base64-encoded in fixed-size chunks straight from
+        disk into fp, so memory use does not grow with the size of the PDF.
+        """
+        outer = MIMEMultipart('mixed', policy=email.policy.SMTP)
+        outer['Subject'] = f"Internship Certificate - {student.internship_name}"
+        outer['From'] = formataddr((self.sender_name, self.sender_email))
+        outer['To'] = student.email
+        outer['Date'] = formatdate(localtime=True)
+        outer['Message-ID'] = make_msgid()
+        outer.attach(MIMEText(self._create_email_body(student), 'html', 'utf-8', policy=email.policy.SMTP))
+        
+        has_attachment = bool(certificate_path) and os.path.exists(certificate_path)
+        if has_attachment:
+            # The attachment part carries a placeholder payload that the
+            # streamed file content replaces when the message is written
+            placeholder = f"ATTACHMENT-{uuid.uuid4().hex}"
+            attachment = MIMEBase('application', 'pdf', policy=email.policy.SMTP)
+            attachment['Content-Transfer-Encoding'] = 'base64'
+            attachment.add_header('Content-Disposition', 'attachment',
+                                  filename=f"certificate_{student.certificate_id}.pdf")
+            attachment.set_payload(placeholder)
+            outer.attach(attachment)
+        
+        serialized = outer.as_bytes()
+        if not has_attachment:
+            fp.write(serialized)
+            return
+        
+        prefix, suffix = serialized.split(placeholder.encode('ascii'), 1)
+        fp.write(prefix)
+        with open(certificate_path, 'rb') as pdf:
+            while True:
+                chunk = pdf.read(ATTACHMENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                fp.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+        fp.write(suffix)
+    
+    def _streamed_certificate_message(self, student, certificate_path):
+        """Write the certificate email to a temporary file and return it as a StreamedMessage"""
+        with tempfile.NamedTemporaryFile(suffix='.eml', delete=False) as fp:
+            self.write_certificate_message(fp, student, certificate_path)
+        return StreamedMessage(
+            formataddr((self.sender_name, self.sender_email)), [student.email], fp.name, temporary=True
+        )
+    
+    def send_certificate_email(self, student, certificate_path):
+        """Send certificate email to student"""
+        try:
+            message = self._streamed_certificate_message(student, certificate_path)
+            
+            # Send email
+            try:
+                with metrics.timer(SMTP_SEND):
+                    with mail.connect() as connection:
+                        send_streamed(connection, message)
+            finally:
+                message.discard()
+            metrics.count(SMTP_SEND)
+            
+            logger.info(f"Certificate email sent successfully to {student.email}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error sending certificate email to {student.email}: {str(e)}")
+            return False
+    
+    def send_certificates_bulk(self, deliveries, workers=None, rate_per_minute=None, on_result=None):
+        """Send certificate emails concurrently over pooled SMTP connections
+        
+        deliveries is an iterable of (student, certificate_path) pairs. Returns
+        one outcome dict per student with key (the certificate ID), recipient,
+        success and error, plus refused (recipients the server turned down)
+        for messages that were sent.
+        """
+        mailer = BulkMailer(workers=workers, rate_per_minute=rate_per_minute)
+        tasks = (
+            (student.certificate_id, student.email,
+             partial(self._streamed_certificate_message, student, certificate_path))
+            for student, certificate_path in deliveries
+        )
+        return mailer.send_all(tasks, on_result=on_result)
+    
+    def _create_email_body(self, student):
+        """Create personalized email body from the precompiled template"""
+        details = [_EMAIL_DETAILS.format(
+            student_name=student.student_name,
+            internship_name=student.internship_name,
+            start_date=student.internship_start_date.strftime('%B %d, %Y'),
+            end_date=student.internship_end_date.strftime('%B %d, %Y'),
+            certificate_id=student.certificate_id,
+            college_name=student.college_name,
+            branch=student.branch
+        )]
+        
+        if student.mentor_name:
+            details.append(_EMAIL_OPTIONAL_LINE.format(label='Mentor', value=student.mentor_name))
         
-        return body
+        if student.company_name:
+            details.append(_EMAIL_OPTIONAL_LINE.format(label='Company', value=student.company_name))
+        
+        if student.performance_rating:
+            details.append(_EMAIL_OPTIONAL_LINE.format(label='Performance Rating', value=student.performance_rating))
+        
+        details.append(_EMAIL_CLOSING.format(certificate_id=student.certificate_id))
+        return _EMAIL_HEAD + ''.join(details) + _EMAIL_FOOTER
     
-    def send_bulk_notification(self, recipients, subject, message):
+    def send_bulk_notification(self, recipients, subject, message, workers=None, rate_per_minute=None):
         """Send bulk notification emails"""
         try:
-            successful_sends = 0
-            failed_sends = 0
+            def build(recipient):
+                msg = Message(
+                    subject=subject,
+                    sender=(self.sender_name, self.sender_email),
+                    recipients=[recipient]
+                )
+                msg.html = message
+                return msg
             
-            for recipient in recipients:
-                try:
-                    msg = Message(
-                        subject=subject,
-                        sender=(self.sender_name, self.sender_email),
-                        recipients=[recipient]
-                    )
-                    msg.html = message
-                    mail.send(msg)
-                    successful_sends += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error sending notification to {recipient}: {str(e)}")
-                    failed_sends += 1
+            mailer = BulkMailer(workers=workers, rate_per_minute=rate_per_minute)
+            results = mailer.send_all(
+                (recipient, recipient, partial(build, recipient)) for recipient in recipients
+            )
+            successful_sends = sum(1 for result in results if result['success'])
             
             return {
                 'successful': successful_sends,
-                'failed': failed_sends,
-                'total': len(recipients)
+                'failed': len(results) - successful_sends,
+                'total': len(recipients),
+                'results': results
             }
             
         except Exception as e:
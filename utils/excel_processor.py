@@ -1,8 +1,16 @@
+import csv
 import pandas as pd
-import uuid
+import openpyxl
 from datetime import datetime, date
 from app import db
 from models import Student, BatchUpload, CertificateStatus
+from utils.dashboard_stats import dashboard_stats, STUDENTS, STATUS_PREFIX
+from utils.progress_bus import progress_bus, Throttle, PROGRESS_DB_INTERVAL
+from utils.verification_cache import verification_cache
+from utils.id_allocator import certificate_id_allocator
+from utils.date_parser import DateColumnParser, describe_format
+from utils.metrics import metrics, READ, VALIDATE, INSERT
+from utils.batch_timings import batch_timings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,11 +30,33 @@ class ExcelProcessor:
             'skills_acquired', 'project_title', 'certificate_id', 'date_of_issue', 'remarks'
         ]
 
+        self.date_columns = ['internship_start_date', 'internship_end_date', 'date_of_issue']
+        self.date_parser = DateColumnParser()
+        # Format settled for each date column, kept across the chunks of one upload
+        self.date_formats = {}
+        self.warnings = []
+        # Certificate IDs reserved for the rows of the upload in progress
+        self._reserved_ids = iter(())
+
     def process_file(self, filepath, batch_id):
         """Process uploaded Excel file and create student records"""
+        # Time spent reading, validating and inserting is stored per batch
+        try:
+            with metrics.collect_breakdown() as breakdown:
+                result = self._process_file(filepath, batch_id)
+        finally:
+            # Reserved IDs left unused by this upload only leave gaps; the
+            # next upload reserves its own
+            self._reserved_ids = iter(())
+        batch_timings.record(batch_id, breakdown)
+        return result
+
+    def _process_file(self, filepath, batch_id):
         try:
             # Read Excel file
-            df = pd.read_excel(filepath)
+            with metrics.timer(READ):
+                df = pd.read_excel(filepath)
+            metrics.count(READ, len(df))
 
             # Clean column names
             df.columns = df.columns.str.lower().str.strip().str.replace(' ', '_')
@@ -64,6 +94,17 @@ class ExcelProcessor:
             successful = 0
             failed = 0
             errors = []
+            progress_throttle = Throttle(PROGRESS_DB_INTERVAL)
+            # Rows added since the last commit, counted as successful until it succeeds
+            uncommitted = []
+
+            # Reserve IDs for rows without one before the loop opens a write transaction
+            if 'certificate_id' in df.columns:
+                missing = df['certificate_id'].isna() | (df['certificate_id'].astype(str).str.strip() == '')
+                missing_count = int(missing.sum())
+            else:
+                missing_count = len(df)
+            self._reserved_ids = iter(certificate_id_allocator.allocate(missing_count))
 
             for index, row in df.iterrows():
                 try:
@@ -78,12 +119,14 @@ class ExcelProcessor:
                         continue
 
                     # Create student record
-                    student_data = self._process_row(row, index + 1)
+                    with metrics.timer(VALIDATE):
+                        student_data = self._process_row(row, index + 1)
                     if student_data:
                         student = Student(**student_data)
 
                         db.session.add(student)
                         successful += 1
+                        uncommitted.append(index + 2)
                     else:
                         failed += 1
 
@@ -96,21 +139,40 @@ class ExcelProcessor:
 
                 processed += 1
 
-                # Update progress
-                batch_upload.processed_records = processed
-                batch_upload.successful_records = successful
-                batch_upload.failed_records = failed
-
-                if processed % 10 == 0:  # Commit every 10 records
+                # Update progress; listeners get every row, the batch row is
+                # written at most once per PROGRESS_DB_INTERVAL seconds
+                progress_bus.publish(batch_id, processed_records=processed,
+                                     successful_records=successful, failed_records=failed)
+                if progress_throttle.ready():
+                    batch_upload.processed_records = processed
+                    batch_upload.successful_records = successful
+                    batch_upload.failed_records = failed
+
+                # Students are committed every 10 records
+                if len(uncommitted) >= 10:
                     try:
-                        db.session.commit()
+                        with metrics.timer(INSERT):
+                            db.session.commit()
                     except Exception as e:
-                        logger.error(f"Database commit error: {str(e)}")
                         db.session.rollback()
+                        # The rolled back rows were counted as successful
+                        error_msg = (f"Rows {uncommitted[0]}-{uncommitted[-1]}: "
+                                     f"Database commit failed: {str(e)}")
+                        logger.error(error_msg)
+                        errors.append(error_msg)
+                        successful -= len(uncommitted)
+                        failed += len(uncommitted)
+                    uncommitted = []
 
             # Final commit
             try:
-                db.session.commit()
+                batch_upload.processed_records = processed
+                batch_upload.successful_records = successful
+                batch_upload.failed_records = failed
+                with metrics.timer(INSERT):
+                    db.session.commit()
+                metrics.count(VALIDATE, processed)
+                metrics.count(INSERT, successful)
 
                 # Update batch status
                 batch_upload.status = 'completed' if failed == 0 else 'completed_with_errors'
@@ -165,6 +227,362 @@ class ExcelProcessor:
                 'failed': 0
             }
 
+    def process_file_bulk(self, filepath, batch_id, chunk_size=5000, progress_callback=None):
+        """Process uploaded Excel/CSV file column-wise and bulk insert student records
+
+        Produces the same per-row error messages as process_file, but streams
+        the file in chunks of chunk_size rows, validates whole columns at once,
+        checks existing roll numbers with set-based queries and inserts each
+        chunk's valid rows in a single bulk insert. Peak memory is bounded by
+        the chunk size rather than the file size.
+
+        If progress_callback is given it is called after each chunk with
+        (processed, successful, failed); returning False stops the ingest
+        after the current chunk and marks the batch as cancelled.
+        Time spent reading, validating and inserting is stored per batch
+        (utils.batch_timings).
+        """
+        with metrics.collect_breakdown() as breakdown:
+            result = self._process_file_bulk(filepath, batch_id, chunk_size, progress_callback)
+        batch_timings.record(batch_id, breakdown)
+        return result
+
+    def _process_file_bulk(self, filepath, batch_id, chunk_size, progress_callback):
+        batch_upload = None
+        try:
+            try:
+                reader = SpreadsheetChunkReader(filepath, self.required_columns, chunk_size)
+            except ValueError as e:
+                logger.error(str(e))
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'processed': 0,
+                    'successful': 0,
+                    'failed': 0
+                }
+
+            batch_upload = BatchUpload.query.get(batch_id)
+            if not batch_upload:
+                reader.close()
+                error_msg = "Batch upload record not found"
+                logger.error(error_msg)
+                return {
+                    'success': False,
+                    'error': error_msg,
+                    'processed': 0,
+                    'successful': 0,
+                    'failed': 0
+                }
+
+            batch_upload.total_records = reader.total_rows or 0
+            db.session.commit()
+
+            self.date_formats = {}
+            self.warnings = []
+
+            processed = 0
+            successful = 0
+            failed = 0
+            errors = []
+
+            for chunk in metrics.timed_iter(READ, reader):
+                metrics.count(READ, len(chunk))
+                with metrics.timer(VALIDATE):
+                    records, row_errors = self._validate_frame(chunk)
+                metrics.count(VALIDATE, len(chunk))
+                errors.extend(row_errors[index] for index in sorted(row_errors))
+
+                try:
+                    with metrics.timer(INSERT):
+                        if records:
+                            db.session.bulk_insert_mappings(Student, records)
+                            # Bulk inserts skip the ORM flush events that keep the dashboard counters
+                            dashboard_stats.add({
+                                STUDENTS: len(records),
+                                STATUS_PREFIX + CertificateStatus.PENDING.name: len(records)
+                            })
+                        successful += len(records)
+                        failed += len(row_errors)
+                        processed += len(chunk)
+
+                        batch_upload.total_records = max(batch_upload.total_records or 0, processed)
+                        batch_upload.processed_records = processed
+                        batch_upload.successful_records = successful
+                        batch_upload.failed_records = failed
+                        db.session.commit()
+                    metrics.count(INSERT, len(records))
+
+                    # Scans of these IDs before the upload may have been cached as not found
+                    for record in records:
+                        verification_cache.invalidate(record['certificate_id'])
+
+                except Exception as e:
+                    error_msg = (f"Rows {chunk.index[0] + 2}-{chunk.index[-1] + 2}: "
+                                 f"Bulk insert failed: {str(e)}")
+                    logger.error(error_msg)
+                    db.session.rollback()
+                    errors.append(error_msg)
+                    failed += len(chunk)
+                    processed += len(chunk)
+
+                if progress_callback and progress_callback(processed, successful, failed) is False:
+                    reader.close()
+                    batch_upload.status = 'cancelled'
+                    batch_upload.error_details = '\n'.join(self.warnings + errors) or None
+                    db.session.commit()
+                    logger.info(f"Bulk processing cancelled after {processed} records")
+                    return {
+                        'success': False,
+                        'cancelled': True,
+                        'error': 'Processing cancelled',
+                        'processed': processed,
+                        'successful': successful,
+                        'failed': failed,
+                        'errors': errors
+                    }
+
+            batch_upload.total_records = processed
+            batch_upload.processed_records = processed
+            batch_upload.successful_records = successful
+            batch_upload.failed_records = failed
+            batch_upload.status = 'completed' if failed == 0 else 'completed_with_errors'
+            batch_upload.error_details = '\n'.join(self.warnings + errors) or None
+            db.session.commit()
+
+            logger.info(f"Bulk processed {successful} out of {processed} records")
+
+            return {
+                'success': True,
+                'processed': processed,
+                'successful': successful,
+                'failed': failed,
+                'errors': errors,
+                'warnings': self.warnings
+            }
+
+        except Exception as e:
+            error_msg = f"Error processing Excel file: {str(e)}"
+            logger.error(error_msg)
+            db.session.rollback()
+
+            try:
+                if batch_upload:
+                    batch_upload.status = 'failed'
+                    batch_upload.error_details = error_msg
+                    db.session.commit()
+            except Exception as db_error:
+                logger.error(f"Error updating batch status: {str(db_error)}")
+
+            return {
+                'success': False,
+                'error': error_msg,
+                'processed': 0,
+                'successful': 0,
+                'failed': 0
+            }
+
+    def _validate_frame(self, df):
+        """Validate a whole DataFrame column-wise
+
+        Returns a tuple of (records, row_errors) where records is a list of
+        student dicts ready for insertion and row_errors maps the DataFrame
+        index of each rejected row to its error message. Checks run in the
+        same order as _process_row so the first failing check wins. The index
+        of df must hold each row's zero-based position in the file.
+        """
+        messages = pd.Series(None, index=df.index, dtype=object)
+
+        def flag(mask, build_message):
+            selected = mask & messages.isna()
+            for index in selected[selected].index:
+                messages.at[index] = build_message(index)
+
+        def text(col):
+            if col not in df.columns:
+                return pd.Series('', index=df.index, dtype=object)
+            return df[col].astype(str).str.strip()
+
+        def optional_text(col):
+            if col not in df.columns:
+                return pd.Series(None, index=df.index, dtype=object)
+            values = text(col).where(df[col].notna() & text(col).ne(''))
+            return values.astype(object).where(values.notna(), None)
+
+        # Required fields
+        for col in self.required_columns:
+            values = text(col)
+            blank = df[col].isna() | values.eq('') | values.str.lower().isin(['nan', 'none', 'null'])
+            flag(blank, lambda i, col=col: f"Missing required field: {col} (found: '{df.at[i, col]}')")
+
+        # Dates
+        chunk_formats = self._detect_date_formats(df)
+        start_dates, start_errors = self._parse_date_column(
+            df['internship_start_date'], chunk_formats.get('internship_start_date'))
+        flag(start_errors.notna(), lambda i: start_errors.at[i])
+        end_dates, end_errors = self._parse_date_column(
+            df['internship_end_date'], chunk_formats.get('internship_end_date'))
+        flag(end_errors.notna(), lambda i: end_errors.at[i])
+
+        start_ts = pd.to_datetime(start_dates)
+        end_ts = pd.to_datetime(end_dates)
+        flag(start_ts > end_ts, lambda i: "Internship start date cannot be after end date")
+
+        # Issue date defaults to today when not provided
+        if 'date_of_issue' in df.columns:
+            issue_dates, issue_errors = self._parse_date_column(df['date_of_issue'], chunk_formats.get('date_of_issue'))
+            flag(issue_errors.notna(), lambda i: issue_errors.at[i])
+            issue_dates = issue_dates.where(df['date_of_issue'].notna(), date.today())
+        else:
+            issue_dates = pd.Series(date.today(), index=df.index, dtype=object)
+
+        # Email
+        emails = text('email')
+        valid_email = emails.str.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+        flag(~valid_email.fillna(False).astype(bool), lambda i: f"Invalid email format: {emails.at[i]}")
+
+        # Duration, computed from the dates when not provided
+        computed_weeks = (end_ts - start_ts).dt.days // 7
+        durations = pd.Series(None, index=df.index, dtype=object)
+        if 'duration_weeks' in df.columns:
+            provided = df['duration_weeks'].notna()
+            numeric = pd.to_numeric(df['duration_weeks'], errors='coerce')
+            flag(provided & numeric.isna(),
+                 lambda i: f"invalid literal for int() with base 10: '{df.at[i, 'duration_weeks']}'")
+            durations = numeric.where(provided, computed_weeks)
+        else:
+            durations = computed_weeks
+        durations = durations.astype(object).where(durations.notna(), None)
+
+        row_errors = {
+            index: f"Row {index + 2}: Row {index + 1}: {message}"
+            for index, message in messages.dropna().items()
+        }
+
+        # Duplicate roll numbers take precedence over validation errors, as in
+        # process_file, and the first valid occurrence in the file wins.
+        roll_numbers = text('roll_number')
+        existing_rolls = self._existing_values(Student.roll_number, roll_numbers.unique())
+        seen_rolls = set()
+        for index, roll_number in roll_numbers.items():
+            if roll_number in existing_rolls or roll_number in seen_rolls:
+                row_errors[index] = (
+                    f"Row {index + 2}: Student with roll number "
+                    f"{df.at[index, 'roll_number']} already exists"
+                )
+            elif index not in row_errors:
+                seen_rolls.add(roll_number)
+
+        # Certificate IDs, keeping provided ones when present and unused
+        certificate_ids = optional_text('certificate_id')
+        provided_ids = certificate_ids.dropna()
+        existing_ids = self._existing_values(Student.certificate_id, provided_ids.unique())
+        seen_ids = set()
+        for index, cert_id in provided_ids.items():
+            if index in row_errors:
+                continue
+            if cert_id in existing_ids or cert_id in seen_ids:
+                row_errors[index] = f"Row {index + 2}: Certificate ID {cert_id} already exists"
+            else:
+                seen_ids.add(cert_id)
+
+        valid = pd.Series(True, index=df.index)
+        valid[list(row_errors)] = False
+        missing_ids = valid & certificate_ids.isna()
+        certificate_ids[missing_ids] = self._generate_certificate_ids(int(missing_ids.sum()), exclude=seen_ids)
+
+        columns = {
+            'student_name': text('student_name'),
+            'roll_number': roll_numbers,
+            'branch': text('branch'),
+            'college_name': text('college_name'),
+            'email': emails,
+            'phone_number': optional_text('phone_number'),
+            'internship_name': text('internship_name'),
+            'internship_start_date': start_dates,
+            'internship_end_date': end_dates,
+            'duration_weeks': durations,
+            'mentor_name': optional_text('mentor_name'),
+            'mentor_email': optional_text('mentor_email'),
+            'internship_location': optional_text('internship_location'),
+            'company_name': optional_text('company_name'),
+            'performance_rating': optional_text('performance_rating'),
+            'skills_acquired': optional_text('skills_acquired'),
+            'project_title': optional_text('project_title'),
+            'certificate_id': certificate_ids,
+            'date_of_issue': issue_dates,
+            'remarks': optional_text('remarks'),
+        }
+        valid_frame = pd.DataFrame({key: values[valid] for key, values in columns.items()})
+        valid_frame['duration_weeks'] = pd.Series(
+            [int(weeks) if weeks is not None else None for weeks in valid_frame['duration_weeks']],
+            index=valid_frame.index, dtype=object
+        )
+        valid_frame['certificate_status'] = CertificateStatus.PENDING
+        records = valid_frame.astype(object).where(valid_frame.notna(), None).to_dict('records')
+
+        return records, row_errors
+
+    def _detect_date_formats(self, df):
+        """Return the format to parse each date column of this chunk with
+
+        A column's format is settled by the first chunk whose values fit only
+        one format. A column whose values read both day-first and month-first
+        takes the format another date column settled on; failing that it is
+        read day-first for now and a warning is recorded instead of guessing
+        silently.
+        """
+        detected = {}
+        for column in self.date_columns:
+            if column in df.columns and column not in self.date_formats:
+                date_format, alternative = self.date_parser.detect_format(df[column])
+                if date_format and not alternative:
+                    self.date_formats[column] = date_format
+                elif date_format:
+                    detected[column] = (date_format, alternative)
+
+        chunk_formats = dict(self.date_formats)
+        for column, (date_format, alternative) in detected.items():
+            settled = set(self.date_formats.values())
+            if alternative in settled and date_format not in settled:
+                date_format = alternative
+            elif date_format not in settled:
+                warning = (f"Dates in {column} read as both {describe_format(date_format)} and "
+                           f"{describe_format(alternative)}; read as {describe_format(date_format)}")
+                if warning not in self.warnings:
+                    self.warnings.append(warning)
+                    logger.warning(warning)
+            chunk_formats[column] = date_format
+        return chunk_formats
+
+    def _parse_date_column(self, series, date_format=None):
+        """Parse a column of dates in one vectorized pass
+
+        Returns a tuple of (dates, errors) Series aligned with the input.
+        """
+        return self.date_parser.parse(series, date_format)
+
+    def _existing_values(self, column, values, chunk_size=500):
+        """Return the subset of values already stored in the given column"""
+        values = [value for value in values if value is not None]
+        existing = set()
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            rows = db.session.query(column).filter(column.in_(chunk)).all()
+            existing.update(row[0] for row in rows)
+        return existing
+
+    def _generate_certificate_ids(self, count, exclude=()):
+        """Allocate a block of unique certificate IDs, skipping any given in the upload itself"""
+        exclude = set(exclude)
+        cert_ids = []
+        while len(cert_ids) < count:
+            cert_ids.extend(
+                cert_id for cert_id in certificate_id_allocator.allocate(count - len(cert_ids))
+                if cert_id not in exclude
+            )
+        return cert_ids
+
     def _validate_columns(self, columns):
         """Validate that required columns are present"""
         columns = [col.lower().strip().replace(' ', '_') for col in columns]
@@ -253,39 +671,91 @@ class ExcelProcessor:
             raise ValueError(f"Row {row_number}: {str(e)}")
 
     def _generate_certificate_id(self):
-        """Generate unique certificate ID"""
-        while True:
-            cert_id = f"CERT-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-            existing = Student.query.filter_by(certificate_id=cert_id).first()
-            if not existing:
-                return cert_id
+        """Return a unique certificate ID, taken from the IDs reserved for this upload when there are any"""
+        cert_id = next(self._reserved_ids, None)
+        return cert_id or certificate_id_allocator.allocate(1)[0]
 
     def _parse_date(self, date_value):
         """Parse date from various formats"""
-        if pd.isna(date_value):
-            return None
-
-        if isinstance(date_value, (date, datetime)):
-            return date_value.date() if isinstance(date_value, datetime) else date_value
-
-        date_str = str(date_value).strip()
-
-        # Try various date formats
-        date_formats = [
-            '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y',
-            '%Y/%m/%d', '%d.%m.%Y', '%m.%d.%Y', '%Y.%m.%d'
-        ]
-
-        for fmt in date_formats:
-            try:
-                return datetime.strptime(date_str, fmt).date()
-            except ValueError:
-                continue
-
-        raise ValueError(f"Unable to parse date: {date_value}")
+        return self.date_parser.parse_value(date_value)
 
     def _validate_email(self, email):
         """Basic email validation"""
         import re
         pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
\ No newline at end of file
+        return re.match(pattern, email) is not None
+
+
+class SpreadsheetChunkReader:
+    """Stream an Excel/CSV file as fixed-size DataFrame chunks
+
+    The header is read and checked against the required columns when the
+    reader is created, before any data rows are loaded. Iterating yields
+    DataFrames of at most chunk_size rows whose index is the zero-based row
+    position in the file, so row numbers in error messages stay correct.
+    """
+
+    def __init__(self, filepath, required_columns, chunk_size=5000):
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.total_rows = None
+        self._workbook = None
+
+        if filepath.lower().endswith('.csv'):
+            header = pd.read_csv(filepath, nrows=0).columns
+            # Count records rather than lines: quoted values can span lines,
+            # and blank lines are skipped by read_csv as well
+            with open(filepath, newline='', encoding='utf-8', errors='replace') as f:
+                self.total_rows = max(sum(1 for record in csv.reader(f) if record) - 1, 0)
+        else:
+            self._workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+            self._rows = self._workbook.active.iter_rows(values_only=True)
+            header = next(self._rows, None) or []
+            if self._workbook.active.max_row:
+                self.total_rows = self._workbook.active.max_row - 1
+
+        self.columns = [
+            str(col).lower().strip().replace(' ', '_') if col is not None else f'unnamed_{i}'
+            for i, col in enumerate(header)
+        ]
+
+        missing_columns = [col for col in required_columns if col not in self.columns]
+        if missing_columns:
+            self.close()
+            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    def __iter__(self):
+        try:
+            if self._workbook is None:
+                yield from self._iter_csv()
+            else:
+                yield from self._iter_excel()
+        finally:
+            self.close()
+
+    def _iter_csv(self):
+        for chunk in pd.read_csv(self.filepath, chunksize=self.chunk_size):
+            chunk.columns = self.columns
+            yield chunk
+
+    def _iter_excel(self):
+        buffer = []
+        positions = []
+        for position, row in enumerate(self._rows):
+            # Skip fully blank rows but keep counting so row numbers match the sheet
+            if all(value is None for value in row):
+                continue
+            buffer.append(row[:len(self.columns)])
+            positions.append(position)
+            if len(buffer) >= self.chunk_size:
+                yield pd.DataFrame(buffer, columns=self.columns, index=positions)
+                buffer = []
+                positions = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=self.columns, index=positions)
+
+    def close(self):
+        """Release the underlying workbook handle"""
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
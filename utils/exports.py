@@ -0,0 +1,141 @@
+import io
+import os
+import csv
+import enum
+import logging
+import tempfile
+from datetime import date, datetime
+from flask import Response, request, stream_with_context
+from openpyxl import Workbook
+from app import db
+from models import Student, CertificateStatus
+from utils.certificate_listing import certificate_listing
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    ('Student Name', Student.student_name),
+    ('Roll Number', Student.roll_number),
+    ('Branch', Student.branch),
+    ('College Name', Student.college_name),
+    ('Email', Student.email),
+    ('Phone Number', Student.phone_number),
+    ('Internship Name', Student.internship_name),
+    ('Company Name', Student.company_name),
+    ('Start Date', Student.internship_start_date),
+    ('End Date', Student.internship_end_date),
+    ('Duration (Weeks)', Student.duration_weeks),
+    ('Mentor Name', Student.mentor_name),
+    ('Performance Rating', Student.performance_rating),
+    ('Certificate ID', Student.certificate_id),
+    ('Date of Issue', Student.date_of_issue),
+    ('Certificate Status', Student.certificate_status),
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def export_rows(chunk_size=1000, **filters):
+    """Yield export rows (lists of cell values) for the students matching the listing filters
+
+    Rows are read in id order, chunk_size at a time, continuing from the
+    last id of the previous chunk. Each chunk's read transaction ends
+    before its rows are handed on, so a slow download never holds a
+    database lock while it waits on the client.
+    """
+    query = certificate_listing.filtered_query(**filters).with_entities(
+        Student.id, *[column for _, column in EXPORT_COLUMNS]
+    ).order_by(Student.id)
+
+    last_id = 0
+    while True:
+        chunk = query.filter(Student.id > last_id).limit(chunk_size).all()
+        db.session.rollback()
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        for row in chunk:
+            yield [_cell(value) for value in row[1:]]
+
+
+def csv_chunks(rows, rows_per_chunk=500):
+    """Encode rows as CSV, yielding a header chunk and then one chunk per rows_per_chunk rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(rows, read_size=64 * 1024):
+    """Write rows to a write-only workbook on disk, then yield the file in read_size pieces
+
+    Write-only mode streams each row to a temporary file instead of keeping
+    cells in memory. An XLSX file is a zip archive that only becomes valid
+    once complete, so bytes are sent after the last row has been written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Students')
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        sheet.append(row)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(read_size), b''):
+                yield block
+    finally:
+        os.remove(path)
+
+
+def export_response(export_format='csv'):
+    """Build a streamed export download for the listing filters in request.args
+
+    Accepts the same status, college, branch, internship and search
+    arguments as the certificates listing API. The dashboard report button
+    downloads from it as /api/export/<export_format>.
+    """
+    if export_format not in EXPORT_FORMATS:
+        return Response(f"Unsupported export format: {export_format}", status=400)
+
+    args = request.args
+    filters = {name: args.get(name) or None for name in ('status', 'college', 'branch', 'internship', 'search')}
+    if filters['status'] and filters['status'] not in {status.value for status in CertificateStatus}:
+        return Response(f"Unknown status: {filters['status']}", status=400)
+    rows = export_rows(**filters)
+    chunks = csv_chunks(rows) if export_format == 'csv' else xlsx_chunks(rows)
+
+    filename = f"students_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    logger.info(f"Streaming {export_format} export with filters {filters}")
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
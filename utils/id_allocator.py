@@ -0,0 +1,157 @@
+import re
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.dialects import postgresql, sqlite
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+# Crockford base32: no I, L, O or U, so IDs survive being read out or retyped
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# Letters that are not hex digits. New IDs start with one of these, so they
+# can never equal a legacy uuid4-based ID (eight hex characters).
+LEAD_ALPHABET = 'GHJKMNPQRSTVWXYZ'
+
+COUNTER_BITS = 34
+COUNTER_MASK = (1 << COUNTER_BITS) - 1
+# Odd multiplier and offset of the affine bijection that spreads consecutive
+# counters across the ID space. It makes IDs non-sequential to the eye; it
+# is not a secret and does not make them unguessable.
+SPREAD_MULTIPLIER = 0x2545F491
+SPREAD_OFFSET = 0x1F3A5C7E9
+
+CERTIFICATE_ID_PATTERN = re.compile(rf"^CERT-(\d{{8}})-([{LEAD_ALPHABET}][{ALPHABET}]{{6}})([{ALPHABET}])$")
+
+
+class CertificateIdSequence(db.Model):
+    """Next unreserved certificate ID counter for one day"""
+    __tablename__ = 'certificate_id_sequence'
+
+    day = db.Column(db.String(8), primary_key=True)
+    next_value = db.Column(db.BigInteger, default=0, nullable=False)
+
+
+# ALPHABET values of the lead symbols, which the check digit is computed over
+_LEAD_VALUES = [ALPHABET.index(char) for char in LEAD_ALPHABET]
+# Luhn mod 32 contribution of a doubled symbol value
+_DOUBLED = [(2 * value) // 32 + (2 * value) % 32 for value in range(32)]
+
+
+def _check_value(values):
+    """Return the Luhn mod 32 check value for symbol values, most significant first"""
+    total = 0
+    double = True
+    for value in reversed(values):
+        total += _DOUBLED[value] if double else value
+        double = not double
+    return -total % 32
+
+
+def check_character(code):
+    """Return the Luhn mod 32 check character for a string of ALPHABET characters"""
+    return ALPHABET[_check_value([ALPHABET.index(char) for char in code])]
+
+
+def encode_certificate_id(day, counter):
+    """Format the day's counter as CERT-YYYYMMDD-XXXXXXXX, the last character being a check digit"""
+    value = (counter * SPREAD_MULTIPLIER + SPREAD_OFFSET) & COUNTER_MASK
+    values = [_LEAD_VALUES[value >> 30], (value >> 25) & 31, (value >> 20) & 31, (value >> 15) & 31,
+              (value >> 10) & 31, (value >> 5) & 31, value & 31]
+    return f"CERT-{day}-{''.join(ALPHABET[v] for v in values)}{ALPHABET[_check_value(values)]}"
+
+
+def has_valid_check_digit(certificate_id):
+    """Return whether certificate_id is an allocator ID with a matching check digit
+
+    Catches mistyped IDs without a database lookup. IDs in the older
+    random-hex format have no check digit and return False.
+    """
+    match = CERTIFICATE_ID_PATTERN.match((certificate_id or '').strip().upper())
+    return bool(match) and check_character(match.group(2)) == match.group(3)
+
+
+class CertificateIdAllocator:
+    """Hand out certificate IDs from per-day counter ranges reserved in blocks
+
+    Each day has a row in certificate_id_sequence. A process reserves
+    block_size counters at a time by advancing that row in one short
+    transaction, then formats IDs from its range without touching the
+    database again. Ranges never overlap between processes, so IDs are
+    unique without per-ID lookups. Counters left unused when a process
+    exits are skipped, which only leaves gaps.
+
+    The reservation runs on its own connection and commits straight away.
+    Callers must not hold an open write transaction on SQLite when
+    allocating, or the reservation waits on their own lock; allocate
+    everything a write needs before starting it.
+    """
+
+    def __init__(self, block_size=1000):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 0
+        self._end = 0
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the certificate_id_sequence table if it does not exist yet"""
+        if not self._table_ready:
+            try:
+                CertificateIdSequence.__table__.create(db.engine, checkfirst=True)
+            except DatabaseError:
+                # Another process created it between the check and the create
+                if not inspect(db.engine).has_table(CertificateIdSequence.__tablename__):
+                    raise
+            self._table_ready = True
+
+    def allocate(self, count=1):
+        """Return count new certificate IDs for today"""
+        ids = []
+        with self._lock:
+            day = datetime.now().strftime('%Y%m%d')
+            if day != self._day:
+                self._day, self._next, self._end = day, 0, 0
+
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next, self._end = self._reserve(day, max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(encode_certificate_id(day, counter) for counter in range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def _reserve(self, day, size):
+        """Advance the day's counter by size and return the reserved [start, end) range"""
+        self.init_table()
+        table = CertificateIdSequence.__table__
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ('sqlite', 'postgresql'):
+                insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+                connection.execute(insert.values(day=day, next_value=size).on_conflict_do_update(
+                    index_elements=[table.c.day],
+                    set_={'next_value': table.c.next_value + size}
+                ))
+            else:
+                updated = connection.execute(
+                    table.update().where(table.c.day == day).values(next_value=table.c.next_value + size)
+                ).rowcount
+                if not updated:
+                    connection.execute(table.insert().values(day=day, next_value=size))
+
+            # Still inside the transaction that advanced the row, so this is our own value
+            end = connection.execute(select(table.c.next_value).where(table.c.day == day)).scalar()
+
+        if end > COUNTER_MASK:
+            raise RuntimeError(f"Certificate ID space for {day} is exhausted")
+        logger.debug(f"Reserved certificate ID counters {end - size}-{end - 1} for {day}")
+        return end - size, end
+
+
+certificate_id_allocator = CertificateIdAllocator(
+    block_size=app.config.get('CERTIFICATE_ID_BLOCK_SIZE', 1000)
+)
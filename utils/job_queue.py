@@ -0,0 +1,670 @@
+import os
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import app, db
+from models import Student, Certificate, BatchUpload, CertificateStatus
+from utils.dashboard_stats import register_listeners as register_dashboard_listeners
+from utils.progress_bus import progress_bus, Throttle, PROGRESS_DB_INTERVAL
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKGROUND_IMAGE = 'attached_assets/_Internship Certificate.png'
+
+
+class JobStatus:
+    """Lifecycle states of a background job"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class BackgroundJob(db.Model):
+    """Persistent queue entry for work run outside the request thread"""
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)
+    status = db.Column(db.String(20), default=JobStatus.QUEUED, nullable=False, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch_upload.id'))
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    progress_total = db.Column(db.Integer, default=0)
+    progress_done = db.Column(db.Integer, default=0)
+    progress_failed = db.Column(db.Integer, default=0)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'batch_id': self.batch_id,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': bool(self.cancel_requested),
+            'progress_total': self.progress_total or 0,
+            'progress_done': self.progress_done or 0,
+            'progress_failed': self.progress_failed or 0,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when cancellation has been requested"""
+
+
+class JobFailed(Exception):
+    """Raised by a job handler for failures that retrying cannot fix"""
+
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and cancellation"""
+
+    def __init__(self, job_id, batch_id=None):
+        self.job_id = job_id
+        self.batch_id = batch_id
+        self._write_throttle = Throttle(PROGRESS_DB_INTERVAL)
+        self._pending = None
+
+    def update_progress(self, done, total=None, failed=0):
+        """Publish progress counters and store them on the job and its BatchUpload record
+
+        Every update reaches progress_bus straight away; the database is
+        written at most once per PROGRESS_DB_INTERVAL seconds, or whenever the
+        total changes, and flush_progress writes whatever is still pending.
+        """
+        progress_bus.publish(self.batch_id, processed_records=done, successful_records=done - failed,
+                             failed_records=failed, **({'total_records': total} if total is not None else {}))
+
+        pending = self._pending or {}
+        pending.update({'done': done, 'failed': failed})
+        if total is not None:
+            pending['total'] = total
+        self._pending = pending
+
+        if self._write_throttle.ready(force=total is not None):
+            self.flush_progress()
+
+    def flush_progress(self):
+        """Write the latest unsaved progress counters to the database"""
+        if not self._pending:
+            return
+        done, failed, total = self._pending['done'], self._pending['failed'], self._pending.get('total')
+        self._pending = None
+
+        values = {'progress_done': done, 'progress_failed': failed}
+        if total is not None:
+            values['progress_total'] = total
+        db.session.execute(
+            update(BackgroundJob).where(BackgroundJob.id == self.job_id).values(**values)
+        )
+
+        if self.batch_id:
+            batch_upload = BatchUpload.query.get(self.batch_id)
+            if batch_upload:
+                if total is not None:
+                    batch_upload.total_records = total
+                batch_upload.processed_records = done
+                batch_upload.successful_records = done - failed
+                batch_upload.failed_records = failed
+
+        db.session.commit()
+
+    def is_cancelled(self):
+        """Return True if cancellation of the job has been requested"""
+        return bool(db.session.query(BackgroundJob.cancel_requested).filter_by(
+            id=self.job_id
+        ).scalar())
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.is_cancelled():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by a pool of worker threads
+
+    Jobs are rows in the background_job table, so they survive restarts and
+    can be drained either by threads inside the web process (start) or by a
+    separate worker process (python -m utils.job_queue). Claiming a job is a
+    single conditional UPDATE, so several workers never run the same job.
+    """
+
+    def __init__(self, num_workers=2, poll_interval=1.0, retry_delay=30):
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.handlers = {}
+        self.single_attempt = set()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the background_job table if it does not exist yet"""
+        if not self._table_ready:
+            BackgroundJob.__table__.create(db.engine, checkfirst=True)
+            self._table_ready = True
+
+    def register(self, job_type, retryable=True):
+        """Decorator registering a handler function for a job type
+
+        Jobs of a type registered with retryable=False run at most once,
+        for handlers whose partial work would be repeated by a second run.
+        """
+        def decorator(func):
+            self.handlers[job_type] = func
+            if not retryable:
+                self.single_attempt.add(job_type)
+            return func
+        return decorator
+
+    def enqueue(self, job_type, payload=None, batch_id=None, max_attempts=3, run_after=None):
+        """Add a job to the queue and return it without waiting for it to run
+
+        run_after delays the job until the given UTC datetime.
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if job_type in self.single_attempt:
+            max_attempts = 1
+
+        self.init_table()
+        job = BackgroundJob(
+            job_type=job_type,
+            payload=json.dumps(payload or {}),
+            batch_id=batch_id,
+            max_attempts=max_attempts,
+            status=JobStatus.QUEUED,
+            run_after=run_after or datetime.utcnow()
+        )
+        db.session.add(job)
+
+        if batch_id:
+            batch_upload = BatchUpload.query.get(batch_id)
+            if batch_upload:
+                batch_upload.status = JobStatus.QUEUED
+
+        db.session.commit()
+        logger.info(f"Enqueued {job_type} job {job.id}")
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or ask a running job to stop"""
+        job = BackgroundJob.query.get(job_id)
+        if not job or job.status in JobStatus.FINISHED:
+            return False
+
+        if job.status == JobStatus.QUEUED:
+            self._finish(job, JobStatus.CANCELLED)
+        else:
+            job.cancel_requested = True
+            db.session.commit()
+        return True
+
+    def get_status(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        job = BackgroundJob.query.get(job_id)
+        return job.to_dict() if job else None
+
+    def start(self):
+        """Start worker threads inside the current process"""
+        if self._threads:
+            return
+
+        # Keep the dashboard counters current for rows the jobs write
+        register_dashboard_listeners()
+        with app.app_context():
+            self.init_table()
+            self.requeue_stale_jobs()
+
+        self._stop_event.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self.run_worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"Started {self.num_workers} job workers")
+
+    def stop(self, timeout=10):
+        """Signal worker threads to exit and wait for them"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def requeue_stale_jobs(self, stale_after=600):
+        """Return jobs left running by a crashed worker to the queue
+
+        A running job counts as stale when its row has not been updated for
+        stale_after seconds; progress updates keep live jobs fresh. Each
+        claim counted as an attempt, so a job that has used all of its
+        attempts (one that keeps killing its process, say) fails instead.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        stale_ids = [row.id for row in db.session.query(BackgroundJob.id).filter(
+            BackgroundJob.status == JobStatus.RUNNING, BackgroundJob.updated_at < cutoff
+        )]
+
+        requeued = failed = 0
+        for job_id in stale_ids:
+            job = BackgroundJob.query.get(job_id)
+            if not job or job.status != JobStatus.RUNNING:
+                continue
+            job.error = f"Interrupted on attempt {job.attempts}: the worker running it stopped"
+            if (job.attempts or 0) >= job.max_attempts:
+                self._finish(job, JobStatus.FAILED)
+                failed += 1
+            else:
+                job.status = JobStatus.QUEUED
+                db.session.commit()
+                requeued += 1
+
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs interrupted by a previous shutdown")
+        if failed:
+            logger.error(f"Failed {failed} interrupted jobs that had no attempts left")
+        return requeued
+
+    def run_worker(self):
+        """Claim and run jobs until stop is called"""
+        while not self._stop_event.is_set():
+            with app.app_context():
+                try:
+                    job = self._claim_next()
+                    if job:
+                        self._run(job)
+                except Exception as e:
+                    logger.error(f"Job worker error: {str(e)}")
+                    db.session.rollback()
+                    job = None
+                finally:
+                    db.session.remove()
+
+            if not job:
+                self._stop_event.wait(self.poll_interval)
+
+    def _claim_next(self):
+        """Atomically move the oldest due job from queued to running"""
+        candidate = db.session.query(BackgroundJob.id).filter(
+            BackgroundJob.status == JobStatus.QUEUED,
+            BackgroundJob.run_after <= datetime.utcnow()
+        ).order_by(BackgroundJob.id).first()
+        if not candidate:
+            return None
+
+        claimed = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == candidate.id, BackgroundJob.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=BackgroundJob.attempts + 1,
+                started_at=datetime.utcnow()
+            )
+        ).rowcount
+        db.session.commit()
+
+        return BackgroundJob.query.get(candidate.id) if claimed else None
+
+    def _run(self, job):
+        """Run a claimed job and record its outcome"""
+        handler = self.handlers.get(job.job_type)
+        context = JobContext(job.id, job.batch_id)
+
+        try:
+            if not handler:
+                raise ValueError(f"No handler registered for job type: {job.job_type}")
+
+            if job.batch_id:
+                batch_upload = BatchUpload.query.get(job.batch_id)
+                if batch_upload:
+                    batch_upload.status = 'processing'
+                    db.session.commit()
+
+            with metrics.collect_breakdown() as timings:
+                result = handler(context, **json.loads(job.payload or '{}'))
+            context.flush_progress()
+            # Where the job's time went, by pipeline stage (utils.metrics)
+            if isinstance(result, dict) and timings:
+                result['timings'] = timings
+            job = BackgroundJob.query.get(job.id)
+            job.result = json.dumps(result, default=str) if result is not None else None
+            self._finish(job, JobStatus.COMPLETED)
+            logger.info(f"Job {job.id} ({job.job_type}) completed")
+
+        except JobCancelled:
+            db.session.rollback()
+            context.flush_progress()
+            self._finish(BackgroundJob.query.get(job.id), JobStatus.CANCELLED)
+            logger.info(f"Job {job.id} ({job.job_type}) cancelled")
+
+        except Exception as e:
+            db.session.rollback()
+            context.flush_progress()
+            job = BackgroundJob.query.get(job.id)
+            job.error = str(e)
+            logger.error(f"Job {job.id} ({job.job_type}) failed on attempt {job.attempts}: {str(e)}")
+
+            retryable = not isinstance(e, JobFailed) and not job.cancel_requested
+            if retryable and job.attempts < job.max_attempts:
+                job.status = JobStatus.QUEUED
+                job.run_after = datetime.utcnow() + timedelta(
+                    seconds=self.retry_delay * 2 ** (job.attempts - 1)
+                )
+                db.session.commit()
+            else:
+                self._finish(job, JobStatus.FAILED)
+
+    def _finish(self, job, status):
+        """Mark a job and its BatchUpload record as finished"""
+        job.status = status
+        job.finished_at = datetime.utcnow()
+
+        if job.batch_id:
+            batch_upload = BatchUpload.query.get(job.batch_id)
+            if batch_upload:
+                if status != JobStatus.COMPLETED:
+                    batch_upload.status = status
+                elif batch_upload.status in (JobStatus.QUEUED, 'processing'):
+                    batch_upload.status = (
+                        'completed' if not batch_upload.failed_records else 'completed_with_errors'
+                    )
+                if status == JobStatus.FAILED and job.error:
+                    batch_upload.error_details = job.error
+                batch_upload.completion_time = datetime.utcnow()
+
+        db.session.commit()
+
+
+job_queue = JobQueue(num_workers=int(os.environ.get('JOB_WORKERS', 2)))
+
+
+def enqueue_tracked(job_type, label, payload=None):
+    """Enqueue a job together with a BatchUpload record the progress API can poll"""
+    batch_upload = BatchUpload(filename=label, status=JobStatus.QUEUED)
+    db.session.add(batch_upload)
+    db.session.commit()
+    return job_queue.enqueue(job_type, payload, batch_id=batch_upload.id)
+
+
+# Rows are committed as the file is read, so a second run would start again
+# from row 1 and insert the rows already committed a second time
+@job_queue.register('process_upload', retryable=False)
+def process_upload_job(context, filepath):
+    """Ingest an uploaded spreadsheet into student records"""
+    from utils.excel_processor import ExcelProcessor
+
+    def report(processed, successful, failed):
+        context.update_progress(processed, failed=failed)
+        return not context.is_cancelled()
+
+    result = ExcelProcessor().process_file_bulk(filepath, context.batch_id, progress_callback=report)
+    if result.get('cancelled'):
+        raise JobCancelled(f"Job {context.job_id} was cancelled")
+    if not result['success']:
+        raise JobFailed(result['error'])
+    return result
+
+
+@job_queue.register('generate_certificates')
+def generate_certificates_job(context, background_image_path=DEFAULT_BACKGROUND_IMAGE, send_email=False,
+                              chunk_size=200, max_workers=None, qr_payload_mode='full',
+                              cache_qr_images=False, qr_render_mode='image'):
+    """Generate certificates for pending students, optionally e-mailing each one
+
+    Students are handled in chunks: QR codes are encoded and the certificates
+    rendered across worker processes, and the results are committed before
+    moving on to the next chunk. QR codes stay in memory unless
+    cache_qr_images is set, which also writes them to static/qr_codes.
+    qr_render_mode 'vector' draws in-memory QR codes as PDF shapes.
+    With send_email, each committed chunk is spooled and sent through the
+    mail spool (utils.mail_spool). A student whose latest certificate has the
+    same content fingerprint and whose PDF is still on disk keeps that
+    certificate instead of being rendered again (utils.render_cache).
+    """
+    from utils.certificate_generator import CertificateGenerator
+    from utils.qr_generator import QRGenerator, worker_pool
+    from utils.render_cache import render_cache
+    from utils.artifact_manifest import artifact_manifest, CERTIFICATE
+
+    generator = CertificateGenerator(qr_render_mode=qr_render_mode)
+    try:
+        qr_gen = QRGenerator(payload_mode=qr_payload_mode)
+    except ValueError as e:
+        # Missing signing key for compact payloads; retrying will not set it
+        raise JobFailed(str(e))
+    email_sender = None
+    if send_email:
+        from utils.email_sender import EmailSender
+        from utils.mail_spool import mail_spool
+        email_sender = EmailSender()
+
+    student_ids = [
+        row.id for row in db.session.query(Student.id)
+        .filter_by(certificate_status=CertificateStatus.PENDING).order_by(Student.id)
+    ]
+    context.update_progress(0, len(student_ids))
+
+    generated = 0
+    sent = 0
+    failed = 0
+    # One pool for the whole job: workers keep their generator and prepared
+    # background from chunk to chunk instead of starting cold each time
+    with worker_pool(max_workers or os.cpu_count() or 1) as executor:
+        for offset in range(0, len(student_ids), chunk_size):
+            context.check_cancelled()
+            students = Student.query.filter(
+                Student.id.in_(student_ids[offset:offset + chunk_size])
+            ).order_by(Student.id).all()
+
+            payloads = {
+                student.certificate_id: qr_gen.build_payload(student.certificate_id, student)
+                for student in students
+            }
+            fingerprints = {
+                student.id: generator.fingerprint(student, background_image_path,
+                                                  qr_payload=payloads[student.certificate_id])
+                for student in students
+            }
+
+            # Unchanged certificates keep their existing row and PDF
+            deliveries = []
+            reusable = render_cache.find_reusable(fingerprints)
+            for student in students:
+                if student.id in reusable:
+                    student.certificate_status = CertificateStatus.GENERATED
+                    generated += 1
+                    deliveries.append((student, reusable[student.id]))
+            students = [student for student in students if student.id not in reusable]
+
+            # QR codes are encoded in memory by the render workers unless cached on disk
+            qr_code_paths = {}
+            qr_payloads = None
+            if cache_qr_images:
+                qr_code_paths = {
+                    result['certificate_id']: result['qr_path']
+                    for result in qr_gen.create_batch_qr_codes(students, max_workers=max_workers,
+                                                                payloads=payloads, executor=executor)
+                }
+            else:
+                qr_payloads = {student.certificate_id: payloads[student.certificate_id] for student in students}
+
+            results = generator.generate_batch(
+                students, background_image_path, qr_code_paths,
+                max_workers=max_workers, qr_payloads=qr_payloads, executor=executor
+            ) if students else []
+
+            # Size and hash of every written PDF go to the artifact manifest
+            artifacts = artifact_manifest.record_many(CERTIFICATE, [
+                (result['certificate_id'], result['certificate_path']) for result in results if result['success']
+            ])
+
+            for student, result in zip(students, results):
+                if not result['success']:
+                    student.certificate_status = CertificateStatus.FAILED
+                    failed += 1
+                    continue
+
+                cert_path = result['certificate_path']
+                certificate = Certificate(
+                    student_id=student.id,
+                    certificate_path=cert_path,
+                    # What the QR code encodes: the signed URL in compact mode, the JSON otherwise
+                    qr_code_data=payloads[student.certificate_id],
+                    file_size=artifacts[student.certificate_id]['size'] if student.certificate_id in artifacts else None
+                )
+                db.session.add(certificate)
+                render_cache.record(certificate, student.id, fingerprints[student.id])
+                student.certificate_status = CertificateStatus.GENERATED
+                generated += 1
+                deliveries.append((student, certificate))
+
+            db.session.commit()
+
+            if email_sender and deliveries:
+                mail_spool.enqueue_certificates(email_sender, deliveries)
+                sent += _drain_mail_spool(context)['sent']
+            context.update_progress(min(offset + chunk_size, len(student_ids)), failed=failed)
+
+    return {'generated': generated, 'sent': sent, 'failed': failed}
+
+
+@job_queue.register('export_combined_pdf')
+def export_combined_pdf_job(context, output_path, college_name=None, statuses=None,
+                            background_image_path=DEFAULT_BACKGROUND_IMAGE):
+    """Write the selected students' certificates into one printable multi-page PDF"""
+    from utils.certificate_generator import CertificateGenerator
+    from utils.qr_generator import QRGenerator
+
+    qr_gen = QRGenerator()
+    query = Student.query
+    if college_name:
+        query = query.filter_by(college_name=college_name)
+    if statuses:
+        query = query.filter(Student.certificate_status.in_(
+            [CertificateStatus(status) for status in statuses]
+        ))
+    query = query.order_by(Student.id)
+
+    total = query.count()
+    context.update_progress(0, total)
+
+    def students(page_size=500):
+        # Keyset pages keep memory flat and survive the progress commits
+        done = 0
+        last_id = 0
+        while True:
+            page = query.filter(Student.id > last_id).limit(page_size).all()
+            if not page:
+                return
+            for student in page:
+                yield student
+            done += len(page)
+            last_id = page[-1].id
+            context.update_progress(done)
+
+    result = CertificateGenerator().generate_combined(
+        students(), background_image_path, output_path,
+        qr_payload_builder=lambda student: qr_gen.build_payload(student.certificate_id, student)
+    )
+    context.update_progress(total, failed=len(result['errors']))
+    return result
+
+
+def _drain_mail_spool(context, workers=None, on_progress=None):
+    """Send due spooled mail and schedule a follow-up drain for pending retries"""
+    from utils.mail_spool import mail_spool
+
+    totals = mail_spool.drain(workers=workers, should_stop=context.is_cancelled, on_progress=on_progress)
+
+    next_due = mail_spool.next_retry_at()
+    if next_due:
+        already_scheduled = BackgroundJob.query.filter_by(
+            job_type='drain_mail_spool', status=JobStatus.QUEUED
+        ).first()
+        if not already_scheduled:
+            job_queue.enqueue('drain_mail_spool', {'workers': workers}, run_after=next_due)
+    return totals
+
+
+@job_queue.register('send_certificates')
+def send_certificates_job(context, chunk_size=200, workers=None):
+    """E-mail generated certificates to their students through the mail spool
+
+    Every undelivered certificate is spooled first (a no-op for ones already
+    spooled by an earlier, interrupted run) and the spool is then drained over
+    pooled SMTP connections. Messages that fail are retried later by a
+    drain_mail_spool job.
+    """
+    from utils.email_sender import EmailSender
+    from utils.mail_spool import mail_spool
+
+    email_sender = EmailSender()
+    student_ids = [
+        row.id for row in db.session.query(Student.id)
+        .filter_by(certificate_status=CertificateStatus.GENERATED).order_by(Student.id)
+    ]
+    context.update_progress(0, len(student_ids))
+
+    skipped = 0
+    for offset in range(0, len(student_ids), chunk_size):
+        context.check_cancelled()
+        students = Student.query.filter(
+            Student.id.in_(student_ids[offset:offset + chunk_size])
+        ).order_by(Student.id).all()
+
+        deliveries = []
+        for student in students:
+            certificate = Certificate.query.filter_by(student_id=student.id).order_by(
+                Certificate.id.desc()
+            ).first()
+            if certificate:
+                deliveries.append((student, certificate))
+            else:
+                skipped += 1
+        entries = mail_spool.enqueue_certificates(email_sender, deliveries)
+        skipped += sum(1 for entry in entries if entry is None)
+
+    def report(totals):
+        context.update_progress(skipped + totals['sent'] + totals['dead'], failed=skipped + totals['dead'])
+
+    totals = _drain_mail_spool(context, workers, on_progress=report)
+    return {'sent': totals['sent'], 'failed': skipped + totals['dead'], 'retrying': totals['retrying']}
+
+
+@job_queue.register('drain_mail_spool')
+def drain_mail_spool_job(context, workers=None):
+    """Send spooled mail whose retry is now due"""
+    return _drain_mail_spool(context, workers)
+
+
+if __name__ == "__main__":
+    # Run as a standalone worker process: python -m utils.job_queue
+    job_queue.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        job_queue.stop()
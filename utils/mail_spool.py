@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from functools import partial
+from datetime import datetime, timedelta
+from email.utils import formataddr
+from flask_mail import sanitize_address
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import Student, Certificate, CertificateStatus
+from utils.bulk_mailer import BulkMailer, StreamedMessage
+
+logger = logging.getLogger(__name__)
+
+
+class SpoolStatus:
+    """Lifecycle states of a spooled message"""
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+
+
+class MailSpoolEntry(db.Model):
+    """One outgoing message, serialized to disk once and sent until delivered or dead"""
+    __tablename__ = 'mail_spool'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    certificate_id = db.Column(db.Integer, db.ForeignKey('certificate.id'), index=True)
+    sender = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)
+    message_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default=SpoolStatus.QUEUED, nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=5)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class MailSpool:
+    """Durable outbound mail queue drained through pooled SMTP connections
+
+    Messages are rendered once and written to the spool folder, with a row in
+    the mail_spool table tracking delivery. Each message carries an
+    idempotency key (for certificates, one per Certificate row), so spooling
+    the same certificate twice is a no-op and a delivered certificate is
+    never sent again. Failed sends are retried with exponential backoff until
+    max_attempts, and a drain interrupted by a crash resumes from the rows
+    still queued or left in the sending state.
+
+    Delivery is at-least-once: a crash between the SMTP server accepting a
+    message and its row being marked sent can repeat that single message.
+    """
+
+    def __init__(self, spool_folder=None, max_attempts=5, retry_delay=60, stale_after=600):
+        self.spool_folder = spool_folder or app.config.get('MAIL_SPOOL_FOLDER', 'mail_spool')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self._record_lock = threading.Lock()
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the mail_spool table and folder if they do not exist yet"""
+        if not self._table_ready:
+            MailSpoolEntry.__table__.create(db.engine, checkfirst=True)
+            os.makedirs(self.spool_folder, exist_ok=True)
+            self._table_ready = True
+
+    def enqueue(self, idempotency_key, message, certificate_id=None):
+        """Serialize a flask_mail Message into the spool unless its key is already there
+
+        Returns the spool entry, which is the existing one for a repeated key.
+        """
+        if message.date is None:
+            message.date = time.time()
+        return self._enqueue(
+            idempotency_key, sanitize_address(message.sender),
+            [sanitize_address(r) for r in message.send_to],
+            lambda fp: fp.write(message.as_bytes()), certificate_id
+        )
+
+    def enqueue_certificate(self, email_sender, student, certificate):
+        """Spool the certificate e-mail for a student, skipping delivered certificates
+
+        The message is streamed into the spool file by
+        EmailSender.write_certificate_message, so the PDF is never read into
+        memory whole.
+        """
+        if certificate.email_sent:
+            return None
+
+        entry = self._enqueue(
+            f"certificate-{certificate.id}",
+            formataddr((email_sender.sender_name, email_sender.sender_email)),
+            [student.email],
+            lambda fp: email_sender.write_certificate_message(fp, student, certificate.certificate_path),
+            certificate.id
+        )
+        if certificate.email_delivery_status != 'sent':
+            certificate.email_delivery_status = 'queued'
+            db.session.commit()
+        return entry
+
+    def enqueue_certificates(self, email_sender, deliveries):
+        """Spool the certificate e-mails for (student, certificate) pairs with one commit
+
+        Returns one entry per pair, None for certificates already delivered.
+        If another process spools some of the same certificates meanwhile,
+        the pairs are spooled one at a time instead.
+        """
+        self.init_table()
+        keys = {certificate.id: f"certificate-{certificate.id}" for _, certificate in deliveries}
+        entries = {
+            entry.idempotency_key: entry for entry in MailSpoolEntry.query.filter(
+                MailSpoolEntry.idempotency_key.in_(list(keys.values()))
+            )
+        } if keys else {}
+        sender = formataddr((email_sender.sender_name, email_sender.sender_email))
+
+        results = []
+        for student, certificate in deliveries:
+            if certificate.email_sent:
+                results.append(None)
+                continue
+            key = keys[certificate.id]
+            if key not in entries:
+                entries[key] = self._write_entry(
+                    key, sender, [student.email],
+                    partial(email_sender.write_certificate_message, student=student,
+                            certificate_path=certificate.certificate_path),
+                    certificate.id
+                )
+                db.session.add(entries[key])
+            if certificate.email_delivery_status != 'sent':
+                certificate.email_delivery_status = 'queued'
+            results.append(entries[key])
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return [self.enqueue_certificate(email_sender, student, certificate)
+                    for student, certificate in deliveries]
+        return results
+
+    def _enqueue(self, idempotency_key, sender, recipients, write_message, certificate_id=None):
+        """Write a message to the spool folder with write_message(fp) and record it"""
+        self.init_table()
+        existing = MailSpoolEntry.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+        entry = self._write_entry(idempotency_key, sender, recipients, write_message, certificate_id)
+        db.session.add(entry)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process spooled the same key first
+            db.session.rollback()
+            return MailSpoolEntry.query.filter_by(idempotency_key=idempotency_key).first()
+        return entry
+
+    def _write_entry(self, idempotency_key, sender, recipients, write_message, certificate_id=None):
+        """Write a message to the spool folder and return its unsaved spool entry"""
+        filename = hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest() + '.eml'
+        message_path = os.path.join(self.spool_folder, filename)
+        temp_path = f"{message_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as fp:
+            write_message(fp)
+        os.replace(temp_path, message_path)
+
+        return MailSpoolEntry(
+            idempotency_key=idempotency_key,
+            certificate_id=certificate_id,
+            sender=sender,
+            recipients=json.dumps(recipients),
+            message_path=message_path,
+            max_attempts=self.max_attempts,
+            status=SpoolStatus.QUEUED,
+            next_attempt_at=datetime.utcnow()
+        )
+
+    def requeue_stale(self):
+        """Return messages left in the sending state by a crashed drain to the queue
+
+        claimed_at is refreshed as each message's send starts, so only a
+        message whose own send began stale_after seconds ago counts as
+        stale. A message still waiting in a live drain's batch may be taken
+        back too, but that drain then finds its claim gone and skips it.
+        """
+        self.init_table()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        count = db.session.execute(
+            update(MailSpoolEntry)
+            .where(MailSpoolEntry.status == SpoolStatus.SENDING, MailSpoolEntry.claimed_at < cutoff)
+            .values(status=SpoolStatus.QUEUED, claim_token=None)
+        ).rowcount
+        db.session.commit()
+        if count:
+            logger.warning(f"Requeued {count} spooled messages interrupted by a previous shutdown")
+        return count
+
+    def pending_counts(self):
+        """Return the number of spooled messages in each status"""
+        self.init_table()
+        rows = db.session.query(MailSpoolEntry.status, db.func.count(MailSpoolEntry.id)).group_by(
+            MailSpoolEntry.status
+        ).all()
+        return {status: count for status, count in rows}
+
+    def next_retry_at(self):
+        """Return when the earliest queued message becomes due, or None if nothing is queued"""
+        return db.session.query(db.func.min(MailSpoolEntry.next_attempt_at)).filter(
+            MailSpoolEntry.status == SpoolStatus.QUEUED
+        ).scalar()
+
+    def drain(self, workers=None, batch_size=100, should_stop=None, on_progress=None):
+        """Send every message that is due now and return counts of the outcomes
+
+        Messages whose retry is scheduled later stay queued; call drain again
+        once next_retry_at() has passed. should_stop is checked between
+        batches, and on_progress is called with the running totals after each.
+        """
+        self.init_table()
+        self.requeue_stale()
+        mailer = BulkMailer(workers=workers)
+        totals = {'sent': 0, 'retrying': 0, 'dead': 0}
+
+        while not (should_stop and should_stop()):
+            entries = self._claim_batch(batch_size)
+            if not entries:
+                break
+
+            tasks = []
+            for entry in entries:
+                recipients = json.loads(entry.recipients)
+                tasks.append((
+                    entry.id, ', '.join(recipients),
+                    partial(self._start_send, entry.id, entry.claim_token, entry.sender, recipients,
+                            entry.message_path)
+                ))
+
+            def record(outcome):
+                if outcome.get('skipped'):
+                    return
+                with self._record_lock:
+                    totals[self._record_outcome(outcome)] += 1
+
+            mailer.send_all(tasks, on_result=record)
+            if on_progress:
+                on_progress(dict(totals))
+
+        return totals
+
+    def _claim_batch(self, batch_size):
+        """Atomically move up to batch_size due messages from queued to sending"""
+        candidates = [
+            row.id for row in db.session.query(MailSpoolEntry.id).filter(
+                MailSpoolEntry.status == SpoolStatus.QUEUED,
+                MailSpoolEntry.next_attempt_at <= datetime.utcnow()
+            ).order_by(MailSpoolEntry.id).limit(batch_size)
+        ]
+        if not candidates:
+            return []
+
+        token = uuid.uuid4().hex
+        db.session.execute(
+            update(MailSpoolEntry)
+            .where(MailSpoolEntry.id.in_(candidates), MailSpoolEntry.status == SpoolStatus.QUEUED)
+            .values(status=SpoolStatus.SENDING, claim_token=token, claimed_at=datetime.utcnow())
+        )
+        db.session.commit()
+        return MailSpoolEntry.query.filter_by(claim_token=token).order_by(MailSpoolEntry.id).all()
+
+    def _start_send(self, entry_id, claim_token, sender, recipients, message_path):
+        """Renew the claim on a message as its send starts and return the message to send
+
+        Returns None, so the message is skipped, when the claim was taken
+        back by requeue_stale in the meantime and another drain owns it now.
+        """
+        with self._record_lock:
+            claimed = db.session.execute(
+                update(MailSpoolEntry)
+                .where(MailSpoolEntry.id == entry_id, MailSpoolEntry.claim_token == claim_token,
+                       MailSpoolEntry.status == SpoolStatus.SENDING)
+                .values(claimed_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+        if not claimed:
+            logger.warning(f"Spooled message {entry_id} was reclaimed by another drain; skipping it")
+            return None
+        return StreamedMessage(sender, recipients, message_path)
+
+    def _record_outcome(self, outcome):
+        """Store one delivery outcome on the spool entry and its certificate"""
+        entry = MailSpoolEntry.query.get(outcome['key'])
+        entry.attempts = (entry.attempts or 0) + 1
+        entry.claim_token = None
+
+        certificate = Certificate.query.get(entry.certificate_id) if entry.certificate_id else None
+        if certificate:
+            certificate.email_attempts = (certificate.email_attempts or 0) + 1
+
+        if outcome['success']:
+            result = 'sent'
+            entry.status = SpoolStatus.SENT
+            entry.sent_at = datetime.utcnow()
+            entry.last_error = None
+            if certificate:
+                certificate.email_sent = True
+                certificate.email_sent_at = entry.sent_at
+                certificate.email_delivery_status = 'sent'
+                student = Student.query.get(certificate.student_id)
+                if student:
+                    student.certificate_status = CertificateStatus.SENT
+        else:
+            entry.last_error = outcome['error']
+            if outcome.get('permanent') or entry.attempts >= entry.max_attempts:
+                result = 'dead'
+                entry.status = SpoolStatus.DEAD
+                if certificate:
+                    certificate.email_delivery_status = 'failed'
+            else:
+                result = 'retrying'
+                entry.status = SpoolStatus.QUEUED
+                entry.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=self.retry_delay * 2 ** (entry.attempts - 1)
+                )
+                if certificate:
+                    certificate.email_delivery_status = 'retrying'
+
+        db.session.commit()
+
+        if result == 'sent':
+            try:
+                os.remove(entry.message_path)
+            except OSError:
+                pass
+        return result
+
+
+mail_spool = MailSpool()
+
+
+if __name__ == "__main__":
+    # Drain the spool continuously as a standalone process: python -m utils.mail_spool
+    with app.app_context():
+        try:
+            while True:
+                mail_spool.drain()
+                next_due = mail_spool.next_retry_at()
+                wait = (next_due - datetime.utcnow()).total_seconds() if next_due else 5
+                time.sleep(min(max(wait, 1), 60))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,259 @@
+import os
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages timed by the instrumentation
+READ = 'read'
+VALIDATE = 'validate'
+INSERT = 'insert'
+QR_ENCODE = 'qr_encode'
+QR_SAVE = 'qr_save'
+RENDER = 'render'
+SAVE = 'save'
+SMTP_SEND = 'smtp_send'
+
+# Upper bounds in seconds of the stage duration histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NULL_CONTEXT = nullcontext()
+
+
+class _StageTimer:
+    """Context manager that records how long its block took under a stage"""
+
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.metrics.failed(self.stage)
+        return False
+
+
+class Metrics:
+    """In-process counters and histograms for the certificate pipeline
+
+    Each stage (read, validate, insert, qr_encode, qr_save, render, save,
+    smtp_send) has a duration histogram, a failure counter and an item
+    counter, exposed in the Prometheus text format by render().
+
+    Work done in worker processes is timed inside capture() and the events
+    are sent back with the result and replay()ed in the parent, which is the
+    process that serves /metrics. collect_breakdown() sums the stages
+    recorded by the current thread, e.g. for one upload batch.
+
+    When disabled, timer() returns a shared no-op context manager and
+    timed() calls straight through, so instrumented code pays one attribute
+    check per call.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            # stage -> [bucket counts..., overflow count, sum, count]
+            self._histograms = {}
+            self._failures = {}
+            self._items = {}
+
+    def timer(self, stage):
+        """Return a context manager timing its block under stage"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _StageTimer(self, stage)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function under stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _StageTimer(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_iter(self, stage, iterable):
+        """Yield from iterable, timing each step under stage but not the caller's work in between"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                self.observe(stage, time.perf_counter() - started)
+                self.failed(stage)
+                raise
+            self.observe(stage, time.perf_counter() - started)
+            yield item
+
+    def observe(self, stage, seconds):
+        """Record one duration for stage"""
+        if not self.enabled:
+            return
+        if self._emit(('observe', stage, seconds)):
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [0] * (len(self.buckets) + 3)
+            histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+        self._add_to_breakdowns(stage, 'seconds', seconds)
+        self._add_to_breakdowns(stage, 'calls', 1)
+
+    def count(self, stage, items=1):
+        """Record items (rows, certificates, messages) handled by stage"""
+        if not self.enabled or not items:
+            return
+        if self._emit(('count', stage, items)):
+            return
+        with self._lock:
+            self._items[stage] = self._items.get(stage, 0) + items
+        self._add_to_breakdowns(stage, 'items', items)
+
+    def failed(self, stage):
+        """Record one failed call of stage"""
+        if not self.enabled:
+            return
+        if self._emit(('failed', stage, 1)):
+            return
+        with self._lock:
+            self._failures[stage] = self._failures.get(stage, 0) + 1
+        self._add_to_breakdowns(stage, 'failures', 1)
+
+    @contextmanager
+    def capture(self):
+        """Collect this thread's events in a list instead of recording them
+
+        Used in worker processes: return the list with the result and pass
+        it to replay() in the parent.
+        """
+        events = []
+        captures = self._stack('captures')
+        captures.append(events)
+        try:
+            yield events
+        finally:
+            captures.pop()
+
+    def replay(self, events):
+        """Record events collected by capture(), usually in another process"""
+        for kind, stage, value in events or ():
+            if kind == 'observe':
+                self.observe(stage, value)
+            elif kind == 'count':
+                self.count(stage, value)
+            elif kind == 'failed':
+                self.failed(stage)
+
+    @contextmanager
+    def collect_breakdown(self):
+        """Sum the stages recorded by this thread inside the block
+
+        Yields a dict that fills in as work is done, mapping each stage to
+        its seconds, calls, items and failures.
+        """
+        breakdown = {}
+        breakdowns = self._stack('breakdowns')
+        breakdowns.append(breakdown)
+        try:
+            yield breakdown
+        finally:
+            breakdowns.pop()
+
+    def _stack(self, name):
+        stack = getattr(self._local, name, None)
+        if stack is None:
+            stack = []
+            setattr(self._local, name, stack)
+        return stack
+
+    def _emit(self, event):
+        captures = getattr(self._local, 'captures', None)
+        if captures:
+            captures[-1].append(event)
+            return True
+        return False
+
+    def _add_to_breakdowns(self, stage, field, value):
+        for breakdown in getattr(self._local, 'breakdowns', None) or ():
+            totals = breakdown.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'items': 0, 'failures': 0})
+            totals[field] += value
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {stage: list(values) for stage, values in self._histograms.items()}
+            failures = dict(self._failures)
+            items = dict(self._items)
+
+        lines = [
+            '# HELP certgen_stage_duration_seconds Time spent in one call of a pipeline stage.',
+            '# TYPE certgen_stage_duration_seconds histogram',
+        ]
+        for stage in sorted(histograms):
+            values = histograms[stage]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                lines.append(f'certgen_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'certgen_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {values[-1]}')
+            lines.append(f'certgen_stage_duration_seconds_sum{{stage="{stage}"}} {values[-2]:.6f}')
+            lines.append(f'certgen_stage_duration_seconds_count{{stage="{stage}"}} {values[-1]}')
+
+        lines.append('# HELP certgen_stage_failures_total Calls of a pipeline stage that raised an error.')
+        lines.append('# TYPE certgen_stage_failures_total counter')
+        for stage in sorted(failures):
+            lines.append(f'certgen_stage_failures_total{{stage="{stage}"}} {failures[stage]}')
+
+        lines.append('# HELP certgen_stage_items_total Rows, certificates or messages handled by a pipeline stage.')
+        lines.append('# TYPE certgen_stage_items_total counter')
+        for stage in sorted(items):
+            lines.append(f'certgen_stage_items_total{{stage="{stage}"}} {items[stage]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_response():
+    """Build the response for a Prometheus /metrics endpoint
+
+    Metrics are kept per process; with several server processes, each one
+    reports only the work it did itself.
+    """
+    from flask import Response
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Read from the environment rather than app config so render worker
+# processes, which do not import the app, agree with the server
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off'))
@@ -0,0 +1,212 @@
+import json
+import time
+import logging
+import threading
+from flask import Response, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import app, db
+from models import BatchUpload
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'completed_with_errors', 'failed', 'cancelled')
+
+
+def batch_progress(batch_upload):
+    """Return the upload_progress payload for a BatchUpload row"""
+    state = {
+        'total_records': batch_upload.total_records or 0,
+        'processed_records': batch_upload.processed_records or 0,
+        'successful_records': batch_upload.successful_records or 0,
+        'failed_records': batch_upload.failed_records or 0,
+        'status': batch_upload.status
+    }
+    state['progress_percentage'] = _percentage(state)
+    return state
+
+
+def _percentage(state):
+    total = state.get('total_records') or 0
+    return (state.get('processed_records') or 0) / total * 100 if total > 0 else 0
+
+
+class Throttle:
+    """Let an action through at most once per interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = None
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        if force or self._last is None or now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
+
+
+class ProgressBus:
+    """In-memory latest-progress store that wakes up listeners on change
+
+    Ingest and generation code publish batch progress here as often as they
+    like; it costs a dict update and only changed states wake the waiting
+    streams. Listeners wait on a condition variable instead of polling the
+    database. Finished batches are forgotten after retain seconds.
+    """
+
+    def __init__(self, retain=300):
+        self.retain = retain
+        self._states = {}
+        self._version = 0
+        self._condition = threading.Condition()
+
+    def publish(self, batch_id, **fields):
+        """Merge fields into the batch's progress and notify listeners if it changed"""
+        if not batch_id:
+            return
+        with self._condition:
+            version, state, _ = self._states.get(batch_id, (0, {}, 0))
+            updated = dict(state, **fields)
+            updated['progress_percentage'] = _percentage(updated)
+            if updated == state:
+                return
+
+            self._version += 1
+            self._states[batch_id] = (self._version, updated, time.monotonic())
+            self._prune()
+            self._condition.notify_all()
+
+    def get(self, batch_id):
+        """Return (version, state) for a batch, or (0, None) if nothing was published"""
+        with self._condition:
+            version, state, _ = self._states.get(batch_id, (0, None, 0))
+            return version, dict(state) if state else None
+
+    def wait_for_change(self, batch_id, version, timeout):
+        """Block until the batch moves past version or timeout passes, then return get()"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._states.get(batch_id, (0,))[0] > version, timeout
+            )
+        return self.get(batch_id)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retain
+        stale = [
+            batch_id for batch_id, (_, state, published) in self._states.items()
+            if state.get('status') in FINISHED_STATUSES and published < cutoff
+        ]
+        for batch_id in stale:
+            del self._states[batch_id]
+
+
+progress_bus = ProgressBus()
+
+# Minimum seconds between progress-only database writes
+PROGRESS_DB_INTERVAL = app.config.get('PROGRESS_DB_INTERVAL', 2.0)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_batch_progress(session, flush_context):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, BatchUpload) and obj.id:
+            session.info.setdefault('batch_progress', {})[obj.id] = batch_progress(obj)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_batch_progress(session):
+    # Committed BatchUpload changes (status transitions included) reach the bus
+    # without every call site having to publish them
+    for batch_id, state in session.info.pop('batch_progress', {}).items():
+        progress_bus.publish(batch_id, **state)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_batch_progress(session):
+    session.info.pop('batch_progress', None)
+
+
+def _load_progress(batch_id):
+    """Read a batch's progress from the database, ending the read straight away"""
+    try:
+        batch_upload = BatchUpload.query.get(batch_id)
+        return batch_progress(batch_upload) if batch_upload else None
+    finally:
+        db.session.rollback()
+
+
+def _sse_event(state, version):
+    return f"id: {version}\nevent: progress\ndata: {json.dumps(state)}\n\n"
+
+
+def _sse_missing(batch_id):
+    return f"event: missing\ndata: {json.dumps({'batch_id': batch_id})}\n\n"
+
+
+def progress_events(batch_id, db_fallback_interval=5, heartbeat_interval=15,
+                    max_duration=300, retry_ms=3000):
+    """Yield Server-Sent Events for a batch until it finishes
+
+    An event is sent for the current state and then only when it changes.
+    Updates normally arrive through progress_bus; a batch this process has
+    no progress for (its job runs in a separate worker process) is followed
+    by re-reading the BatchUpload row every db_fallback_interval seconds.
+    The row is re-read either way, so a batch that failed in another
+    process or was deleted still ends the stream.
+
+    A stream lasts at most max_duration seconds. It starts with a retry
+    field, so the browser reconnects retry_ms after it closes and a
+    stream left open on a stuck batch does not hold a worker for ever.
+    """
+    version, state = progress_bus.get(batch_id)
+    if state is None:
+        state = _load_progress(batch_id)
+        if state is None:
+            yield _sse_missing(batch_id)
+            return
+
+    yield f"retry: {retry_ms}\n\n"
+    deadline = time.monotonic() + max_duration
+    last_sent = None
+    last_write = time.monotonic()
+    event_id = 0
+    while True:
+        if state != last_sent:
+            event_id += 1
+            yield _sse_event(state, event_id)
+            last_sent = state
+            last_write = time.monotonic()
+        if state.get('status') in FINISHED_STATUSES:
+            return
+        if time.monotonic() >= deadline:
+            return
+
+        timeout = min(db_fallback_interval, max(deadline - time.monotonic(), 0))
+        new_version, new_state = progress_bus.wait_for_change(batch_id, version, timeout)
+        if new_version > version:
+            version, state = new_version, new_state
+            continue
+
+        # Only this process's commits reach the bus, and the row is written
+        # at most every PROGRESS_DB_INTERVAL, so a bus state is kept unless
+        # the row shows the batch finished
+        stored = _load_progress(batch_id)
+        if stored is None:
+            yield _sse_missing(batch_id)
+            return
+        if not version or stored.get('status') in FINISHED_STATUSES:
+            state = stored
+        if state == last_sent and time.monotonic() - last_write >= heartbeat_interval:
+            # Comment line keeping proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            last_write = time.monotonic()
+
+
+def progress_stream_response(batch_id):
+    """Build the text/event-stream response for a batch's progress"""
+    return Response(
+        stream_with_context(progress_events(batch_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -1,21 +1,48 @@
 import qrcode
 import os
 import json
+import hmac
+import base64
+import hashlib
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse, parse_qs
+from utils.storage import default_storage, QR_CODES
+from utils.metrics import metrics, QR_ENCODE, QR_SAVE
 
 logger = logging.getLogger(__name__)
 
+
+def worker_pool(max_workers):
+    """Return a process pool for QR and certificate rendering
+
+    Workers are started by a forkserver instead of being forked from the
+    web or job process, whose threads (job workers, audit writer, progress
+    bus, database pool) may hold locks at the moment of the fork. Render
+    workers import only the utils modules they need, never the app.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver'))
+
+
 class QRGenerator:
     """Generate QR codes for certificate verification"""
     
-    def __init__(self):
-        self.qr_codes_dir = 'static/qr_codes'
-        os.makedirs(self.qr_codes_dir, exist_ok=True)
+    def __init__(self, payload_mode='full'):
+        self.qr_codes_dir = QR_CODES
+        self.storage = default_storage()
         
         # Base URL for verification (will be updated with actual domain)
         self.base_url = "https://localhost:5000"
+        
+        # 'full' embeds the student details as JSON, 'compact' only a signed verification URL
+        self.payload_mode = payload_mode
+        # Never fall back to a built-in key: anyone could forge signatures with it
+        self.signing_key = os.environ.get('QR_SIGNING_KEY') or os.environ.get('SESSION_SECRET')
+        if payload_mode == 'compact' and not self.signing_key:
+            raise ValueError("Compact QR payloads are signed and need QR_SIGNING_KEY or SESSION_SECRET to be set")
     
     def generate_verification_data(self, certificate_id, student=None):
         """Generate verification data for QR code with comprehensive student details"""
@@ -64,33 +91,33 @@ class QRGenerator:
         
         return json.dumps(verification_data, indent=2)
     
+    def sign_certificate_id(self, certificate_id):
+        """Return a short URL-safe HMAC signature for a certificate ID"""
+        if not self.signing_key:
+            raise ValueError("No QR signing key configured (QR_SIGNING_KEY or SESSION_SECRET)")
+        digest = hmac.new(self.signing_key.encode(), certificate_id.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:9]).decode()
+    
+    def generate_compact_payload(self, certificate_id):
+        """Generate a minimal signed verification URL for the QR code"""
+        return f"{self.base_url}/qr-data/{certificate_id}?s={self.sign_certificate_id(certificate_id)}"
+    
+    def build_payload(self, certificate_id, student=None):
+        """Build the QR payload for the configured payload mode"""
+        if self.payload_mode == 'compact':
+            return self.generate_compact_payload(certificate_id)
+        return self.generate_verification_data(certificate_id, student)
+    
     def create_qr_code(self, data, certificate_id, style='default'):
         """Create QR code image with the given data"""
         try:
-            # Create QR code instance with higher error correction for detailed data
-            qr = qrcode.QRCode(
-                version=None,  # Auto-determine version based on data size
-                error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction for better reliability
-                box_size=8,
-                border=4,
-            )
-            
-            # Add data to QR code
-            qr.add_data(data)
-            qr.make(fit=True)
+            # Generate filename; the storage layer shards it into a subfolder
+            key = self._qr_key(certificate_id)
+            filepath = self.storage.local_path(key, for_write=True)
             
-            # Generate filename
-            filename = f"qr_{certificate_id}.png"
-            filepath = os.path.join(self.qr_codes_dir, filename)
-            
-            # Create QR code image with basic styling
-            img = qr.make_image(
-                fill_color="black",
-                back_color="white"
-            )
-            
-            # Save the image
-            img.save(filepath)
+            _save_qr_image(data, filepath)
+            self.storage.commit(key)
+            _record_qr_codes({certificate_id: filepath})
             
             logger.info(f"QR code generated successfully: {filepath}")
             return filepath
@@ -99,11 +126,32 @@ class QRGenerator:
             logger.error(f"Error generating QR code for certificate {certificate_id}: {str(e)}")
             return None
     
+    def create_qr_image(self, data, certificate_id=None, cache=False):
+        """Create QR code as an in-memory image, optionally caching it as a PNG on disk"""
+        img = make_qr_image(data)
+        if cache and certificate_id:
+            try:
+                key = self._qr_key(certificate_id)
+                img.save(self.storage.local_path(key, for_write=True))
+                self.storage.commit(key)
+                _record_qr_codes({certificate_id: self.storage.local_path(key)})
+            except Exception as e:
+                logger.warning(f"Could not cache QR code for certificate {certificate_id}: {str(e)}")
+        return img
+    
+    def create_verification_qr_image(self, certificate_id, student=None, cache=False):
+        """Create verification QR code as an in-memory image without writing a file by default"""
+        try:
+            return self.create_qr_image(self.build_payload(certificate_id, student), certificate_id, cache)
+        except Exception as e:
+            logger.error(f"Error creating verification QR image for certificate {certificate_id}: {str(e)}")
+            return None
+    
     def create_verification_qr(self, certificate_id, student=None):
         """Create QR code specifically for certificate verification"""
         try:
             # Generate verification data with student details
-            verification_data = self.generate_verification_data(certificate_id, student)
+            verification_data = self.build_payload(certificate_id, student)
             
             # Create QR code
             qr_path = self.create_qr_code(verification_data, certificate_id)
@@ -119,23 +167,59 @@ class QRGenerator:
             logger.error(f"Error creating verification QR code: {str(e)}")
             return None
     
-    def create_batch_qr_codes(self, certificate_ids):
-        """Generate QR codes for multiple certificates"""
+    def create_batch_qr_codes(self, certificates, max_workers=None, chunksize=64, payloads=None, executor=None):
+        """Generate QR codes for multiple certificates across worker processes
+        
+        certificates may hold certificate IDs or student objects; payloads
+        include the student details when a student is given. Payloads are
+        built here, unless given in payloads (certificate_id -> payload), and
+        only the encoding and PNG writing run in the workers. executor is
+        a pool from worker_pool() to reuse; by default one is created per call.
+        """
+        payloads = payloads or {}
+        tasks = []
+        for item in certificates:
+            student = None if isinstance(item, str) else item
+            cert_id = item if student is None else student.certificate_id
+            tasks.append((
+                cert_id,
+                payloads.get(cert_id) or self.build_payload(cert_id, student),
+                self.storage.local_path(self._qr_key(cert_id), for_write=True)
+            ))
+        
         results = []
+        if not tasks:
+            return results
         
-        for cert_id in certificate_ids:
-            qr_path = self.create_verification_qr(cert_id)
-            results.append({
-                'certificate_id': cert_id,
-                'qr_path': qr_path,
-                'success': qr_path is not None
-            })
+        max_workers = max_workers or os.cpu_count() or 1
+        with nullcontext(executor) if executor else worker_pool(max_workers) as executor:
+            outcomes = executor.map(_save_qr_image_safely, tasks, chunksize=chunksize)
+            for (cert_id, _, qr_path), (error, events) in zip(tasks, outcomes):
+                # Timings recorded in the worker process
+                metrics.replay(events)
+                if error:
+                    logger.error(f"Error generating QR code for certificate {cert_id}: {error}")
+                results.append({
+                    'certificate_id': cert_id,
+                    'qr_path': None if error else qr_path,
+                    'success': error is None
+                })
+        
+        for result in results:
+            if result['success']:
+                self.storage.commit(self._qr_key(result['certificate_id']))
+        _record_qr_codes({result['certificate_id']: result['qr_path'] for result in results if result['success']})
         
+        logger.info(f"Batch generated {sum(r['success'] for r in results)} of {len(results)} QR codes")
         return results
     
     def verify_qr_data(self, qr_data):
         """Verify and parse QR code data"""
         try:
+            # Compact payloads are signed verification URLs
+            if qr_data.startswith(('http://', 'https://')):
+                return self._verify_compact_payload(qr_data)
+            
             # Parse JSON data
             data = json.loads(qr_data)
             
@@ -158,29 +242,146 @@ class QRGenerator:
         except Exception as e:
             return {'valid': False, 'error': str(e)}
     
+    def _verify_compact_payload(self, qr_data):
+        """Verify the signature of a compact verification URL"""
+        url = urlparse(qr_data)
+        parts = url.path.rstrip('/').split('/')
+        if len(parts) < 2 or parts[-2] != 'qr-data':
+            return {'valid': False, 'error': 'Invalid QR code type'}
+        
+        certificate_id = parts[-1]
+        signature = parse_qs(url.query).get('s', [''])[0]
+        if not self.signing_key:
+            logger.error("Cannot verify signed QR codes: neither QR_SIGNING_KEY nor SESSION_SECRET is set")
+            return {'valid': False, 'error': 'QR code signatures cannot be verified'}
+        if not hmac.compare_digest(signature, self.sign_certificate_id(certificate_id)):
+            return {'valid': False, 'error': 'Invalid QR code signature'}
+        
+        return {
+            'valid': True,
+            'certificate_id': certificate_id,
+            'verification_url': qr_data,
+            'generated_at': ''
+        }
+    
+    def _qr_key(self, certificate_id):
+        return self.storage.key_for(self.qr_codes_dir, f"qr_{certificate_id}.png")
+    
     def get_qr_code_path(self, certificate_id):
-        """Get the file path for a certificate's QR code"""
-        filename = f"qr_{certificate_id}.png"
-        return os.path.join(self.qr_codes_dir, filename)
+        """Get the file path for a certificate's QR code
+
+        QR codes saved before the sharded layout are still found at their
+        old flat path, static/qr_codes/qr_<id>.png.
+        """
+        legacy_path = os.path.join(self.qr_codes_dir, f"qr_{certificate_id}.png")
+        try:
+            path = self.storage.local_path(self._qr_key(certificate_id))
+        except Exception:
+            if os.path.exists(legacy_path):
+                return legacy_path
+            raise
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            return legacy_path
+        return path
     
     def cleanup_old_qr_codes(self, days_old=30):
-        """Clean up QR code files older than specified days"""
+        """Clean up QR code files older than specified days
+        
+        QR codes written through the storage layer are found with an indexed
+        query on the artifact manifest. Files from the old flat layout are
+        swept from the top level of the folder, which empties as they expire.
+        """
         try:
             import time
-            current_time = time.time()
-            cutoff_time = current_time - (days_old * 24 * 60 * 60)
+            from utils.artifact_manifest import artifact_manifest, QR_CODE
+            cleaned_count = artifact_manifest.cleanup(QR_CODE, days_old)
             
-            cleaned_count = 0
-            for filename in os.listdir(self.qr_codes_dir):
-                if filename.startswith('qr_') and filename.endswith('.png'):
-                    filepath = os.path.join(self.qr_codes_dir, filename)
-                    if os.path.getmtime(filepath) < cutoff_time:
-                        os.remove(filepath)
-                        cleaned_count += 1
+            cutoff_time = time.time() - (days_old * 24 * 60 * 60)
+            if os.path.isdir(self.qr_codes_dir):
+                with os.scandir(self.qr_codes_dir) as entries:
+                    for entry in entries:
+                        if (entry.is_file() and entry.name.startswith('qr_') and entry.name.endswith('.png')
+                                and entry.stat().st_mtime < cutoff_time):
+                            os.remove(entry.path)
+                            cleaned_count += 1
             
             logger.info(f"Cleaned up {cleaned_count} old QR code files")
             return cleaned_count
             
         except Exception as e:
             logger.error(f"Error cleaning up QR codes: {str(e)}")
-            return 0
\ No newline at end of file
+            return 0
+
+
+def _record_qr_codes(paths):
+    """Add written QR codes ({certificate_id: path}) to the artifact manifest when running inside the app"""
+    from flask import has_app_context
+    if not paths or not has_app_context():
+        return
+    try:
+        from utils.artifact_manifest import artifact_manifest, QR_CODE
+        artifact_manifest.record_many(QR_CODE, paths.items())
+    except Exception as e:
+        logger.warning(f"Could not record {len(paths)} QR codes in the artifact manifest: {str(e)}")
+
+
+def _make_qr(data):
+    """Build the QR code for data without rendering it"""
+    # Create QR code instance with higher error correction for detailed data
+    qr = qrcode.QRCode(
+        version=None,  # Auto-determine version based on data size
+        error_correction=qrcode.constants.ERROR_CORRECT_M,  # Medium error correction for better reliability
+        box_size=8,
+        border=4,
+    )
+    
+    # Add data to QR code
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+@metrics.timed(QR_ENCODE)
+def make_qr_matrix(data):
+    """Encode data as a QR code and return its module matrix, quiet zone included
+    
+    Rows are lists of booleans where True marks a dark module; the matrix can
+    be drawn as vector shapes without going through PIL.
+    """
+    return _make_qr(data).get_matrix()
+
+
+@metrics.timed(QR_ENCODE)
+def make_qr_image(data):
+    """Encode data as a QR code and return it as an in-memory PIL image"""
+    qr = _make_qr(data)
+    
+    # Create QR code image with basic styling
+    img = qr.make_image(
+        fill_color="black",
+        back_color="white"
+    )
+    return img.get_image()
+
+
+def _save_qr_image(data, filepath):
+    """Encode data as a QR code and save it as a PNG"""
+    img = make_qr_image(data)
+    with metrics.timer(QR_SAVE):
+        img.save(filepath)
+
+
+def _save_qr_image_safely(task):
+    """Worker entry point for batch QR generation
+
+    Returns an error message (None on success) and the metrics events
+    recorded in the worker.
+    """
+    _, data, filepath = task
+    with metrics.capture() as events:
+        try:
+            _save_qr_image(data, filepath)
+            error = None
+        except Exception as e:
+            error = str(e)
+    return error, events
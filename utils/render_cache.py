@@ -0,0 +1,87 @@
+import os
+import logging
+from datetime import datetime
+from sqlalchemy import func
+from app import db
+from models import Certificate
+
+logger = logging.getLogger(__name__)
+
+
+class CertificateFingerprint(db.Model):
+    """Content fingerprint of the PDF behind a certificate row"""
+    __tablename__ = 'certificate_fingerprint'
+
+    certificate_id = db.Column(db.Integer, db.ForeignKey('certificate.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True)
+    fingerprint = db.Column(db.String(64), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    certificate = db.relationship(Certificate)
+
+
+class RenderCache:
+    """Content-addressed lookup of certificates that were already rendered
+
+    Generation fingerprints each certificate (CertificateGenerator.fingerprint)
+    before rendering it. When the student's latest certificate row has the same
+    fingerprint and its PDF is still on disk, that certificate is reused as is,
+    so re-running a partially failed batch only renders what actually changed.
+    """
+
+    def __init__(self):
+        self._table_ready = False
+
+    def init_table(self):
+        """Create the certificate_fingerprint table if it does not exist yet"""
+        if not self._table_ready:
+            CertificateFingerprint.__table__.create(db.engine, checkfirst=True)
+            self._table_ready = True
+
+    def find_reusable(self, fingerprints):
+        """Return {student id: Certificate} for students whose PDF can be reused
+
+        fingerprints maps student id to the fingerprint of the certificate
+        about to be rendered for that student.
+        """
+        self.init_table()
+        if not fingerprints:
+            return {}
+
+        latest = db.session.query(
+            CertificateFingerprint.student_id,
+            func.max(CertificateFingerprint.certificate_id).label('certificate_id')
+        ).filter(
+            CertificateFingerprint.student_id.in_(list(fingerprints))
+        ).group_by(CertificateFingerprint.student_id).subquery()
+
+        rows = db.session.query(CertificateFingerprint, Certificate).join(
+            latest, CertificateFingerprint.certificate_id == latest.c.certificate_id
+        ).join(Certificate, Certificate.id == CertificateFingerprint.certificate_id)
+
+        reusable = {}
+        for stored, certificate in rows:
+            if stored.fingerprint != fingerprints.get(stored.student_id):
+                continue
+            path = certificate.certificate_path
+            if not path or not os.path.exists(path):
+                continue
+            if certificate.file_size is not None and os.path.getsize(path) != certificate.file_size:
+                continue
+            reusable[stored.student_id] = certificate
+
+        if reusable:
+            logger.info(f"Reusing {len(reusable)} of {len(fingerprints)} already rendered certificates")
+        return reusable
+
+    def record(self, certificate, student_id, fingerprint):
+        """Store the fingerprint of a newly rendered certificate in the current session"""
+        self.init_table()
+        db.session.add(CertificateFingerprint(
+            certificate=certificate,
+            student_id=student_id,
+            fingerprint=fingerprint
+        ))
+
+
+render_cache = RenderCache()
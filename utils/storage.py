@@ -0,0 +1,210 @@
+import os
+import uuid
+import shutil
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Collections of generated artifacts, each a top-level folder of the store
+CERTIFICATES = 'certificates'
+QR_CODES = 'static/qr_codes'
+
+
+def shard_dirs(name):
+    """Return the two shard folders for a file name, taken from a hash of the name
+
+    Hashing spreads names evenly over 65,536 folders whatever the ID format,
+    so no folder grows beyond a few entries per thousand artifacts.
+    """
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return digest[:2], digest[2:4]
+
+
+class LocalStorage:
+    """Artifacts stored as files under root, sharded by a hash of the file name"""
+
+    backend = 'local'
+
+    def __init__(self, root='.'):
+        self.root = root
+
+    def key_for(self, collection, name):
+        """Return the storage key for an artifact: collection/ab/cd/name"""
+        return '/'.join([collection, *shard_dirs(name), name])
+
+    def key_from_path(self, path):
+        """Return the storage key for a local path returned by local_path()"""
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def local_path(self, key, for_write=False):
+        """Return a filesystem path for the artifact, creating its folder when writing"""
+        path = os.path.join(self.root, *key.split('/'))
+        if for_write:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def commit(self, key):
+        """Make a file written at local_path(key, for_write=True) durable; files already are"""
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class NoSuchKey(Exception):
+    """Raised by LocalObjectClient for a missing object, like S3's NoSuchKey"""
+
+
+class LocalObjectClient:
+    """Local stand-in for an S3 client, backed by a directory per bucket
+
+    Implements the part of boto3's S3 client API that ObjectStorage uses
+    (put_object, get_object, head_object, delete_object), so the object
+    storage path can run and be tested without an S3 service.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def put_object(self, Bucket, Key, Body):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writers of the same key each use their own temporary file; the last rename wins
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'wb') as f:
+            if hasattr(Body, 'read'):
+                shutil.copyfileobj(Body, f, 1024 * 1024)
+            else:
+                f.write(Body)
+        os.replace(temporary, path)
+        return {'ETag': f'"{_md5(path)}"'}
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise NoSuchKey(Key)
+        return {'ContentLength': os.path.getsize(path), 'ETag': f'"{_md5(path)}"'}
+
+    def get_object(self, Bucket, Key):
+        head = self.head_object(Bucket, Key)
+        return dict(head, Body=open(self._path(Bucket, Key), 'rb'))
+
+    def delete_object(self, Bucket, Key):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+
+def _md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ObjectStorage(LocalStorage):
+    """Artifacts stored as objects in an S3-style bucket
+
+    client is a boto3 S3 client or a LocalObjectClient. Renderers still
+    write to a local path: the file under cache_root is uploaded on
+    commit() and kept as a local cache that later reads are served from,
+    downloading it again when it is missing.
+    """
+
+    backend = 's3'
+
+    def __init__(self, client, bucket, cache_root='storage_cache'):
+        super().__init__(cache_root)
+        self.client = client
+        self.bucket = bucket
+
+    def local_path(self, key, for_write=False):
+        path = super().local_path(key, for_write)
+        if not for_write and not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, 'wb') as f:
+                shutil.copyfileobj(response['Body'], f, 1024 * 1024)
+            response['Body'].close()
+            os.replace(temporary, path)
+        return path
+
+    def commit(self, key):
+        with open(super().local_path(key), 'rb') as f:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=f)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def delete(self, key):
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        # Remove the cached copy without local_path() downloading it first
+        try:
+            os.remove(super().local_path(key))
+        except FileNotFoundError:
+            pass
+        return existed
+
+
+def storage_from_environment(environ=None):
+    """Build the storage backend selected by STORAGE_BACKEND
+
+    'local' (the default) stores files under STORAGE_ROOT. 'local-s3' uses
+    ObjectStorage with the LocalObjectClient stand-in rooted at
+    STORAGE_OBJECT_ROOT. 's3' uses boto3 with STORAGE_ENDPOINT_URL (optional,
+    for S3-compatible services). Both object backends use STORAGE_BUCKET.
+    The environment is used rather than app config so render worker
+    processes pick the same backend without importing the app.
+    """
+    environ = os.environ if environ is None else environ
+    backend = environ.get('STORAGE_BACKEND', 'local')
+    root = environ.get('STORAGE_ROOT', '.')
+    if backend == 'local':
+        return LocalStorage(root)
+
+    bucket = environ.get('STORAGE_BUCKET', 'certificates')
+    cache_root = os.path.join(root, environ.get('STORAGE_CACHE', 'storage_cache'))
+    if backend == 'local-s3':
+        client = LocalObjectClient(environ.get('STORAGE_OBJECT_ROOT', 'object_store'))
+    elif backend == 's3':
+        import boto3
+        client = boto3.client('s3', endpoint_url=environ.get('STORAGE_ENDPOINT_URL') or None)
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return ObjectStorage(client, bucket, cache_root)
+
+
+_default_storage = None
+
+
+def default_storage():
+    """Return the process-wide storage backend, built from the environment on first use"""
+    global _default_storage
+    if _default_storage is None:
+        _default_storage = storage_from_environment()
+    return _default_storage
@@ -0,0 +1,196 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import app, db
+from models import Student, Certificate
+
+logger = logging.getLogger(__name__)
+
+# Stored for certificate IDs that do not exist, so repeated scans of a bad
+# code are answered without a query
+MISSING = object()
+
+
+class LRUTTLCache:
+    """Thread-safe least-recently-used cache whose entries also expire"""
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value, or None if the key is absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class VerificationCache:
+    """Cache of public verification responses, keyed by certificate ID
+
+    Each certificate ID maps to a dict of cached artefacts: the student and
+    latest certificate IDs, the verification JSON payload and any rendered
+    pages. Unknown IDs are cached as MISSING for a shorter negative_ttl.
+    Entries are dropped when a commit touches the student or its
+    certificates (see the session listeners below); changes made by other
+    processes are picked up when the entry's ttl runs out.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300, negative_ttl=30):
+        self.negative_ttl = negative_ttl
+        self._cache = LRUTTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+
+    def resolve(self, certificate_id):
+        """Return {'student_id', 'certificate_db_id'} for a certificate ID, or None if unknown"""
+        return self._get(certificate_id, 'record', lambda student, certificate: {
+            'student_id': student.id,
+            'certificate_db_id': certificate.id if certificate else None
+        })
+
+    def verification_payload(self, certificate_id):
+        """Return the QRGenerator verification JSON for a certificate ID, or None if unknown"""
+        from utils.qr_generator import QRGenerator
+        return self._get(
+            certificate_id, 'payload',
+            lambda student, certificate: QRGenerator().generate_verification_data(certificate_id, student)
+        )
+
+    def page(self, name, certificate_id, render):
+        """Return a rendered page for a certificate ID, calling render(student, certificate) on a miss
+
+        Returns None for unknown IDs, so the caller can render its not-found page.
+        """
+        return self._get(certificate_id, f"page:{name}", render)
+
+    def invalidate(self, certificate_id):
+        """Drop everything cached for a certificate ID"""
+        if self._cache.delete(certificate_id):
+            with self._lock:
+                self.invalidations += 1
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the cache size"""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0,
+            'invalidations': self.invalidations,
+            'evictions': self._cache.evictions,
+            'expirations': self._cache.expirations,
+            'size': len(self._cache)
+        }
+
+    def _get(self, certificate_id, kind, build):
+        entry = self._cache.get(certificate_id)
+        if entry is MISSING:
+            with self._lock:
+                self.negative_hits += 1
+            return None
+        if entry is not None and kind in entry:
+            with self._lock:
+                self.hits += 1
+            return entry[kind]
+
+        with self._lock:
+            self.misses += 1
+
+        student = Student.query.filter_by(certificate_id=certificate_id).first()
+        if not student:
+            self._cache.set(certificate_id, MISSING, ttl=self.negative_ttl)
+            return None
+
+        certificate = Certificate.query.filter_by(student_id=student.id).order_by(
+            Certificate.id.desc()
+        ).first()
+        value = build(student, certificate)
+
+        # Kinds cached later share the entry (and its expiry) created first
+        entry = self._cache.get(certificate_id)
+        if entry is None or entry is MISSING:
+            entry = {}
+            self._cache.set(certificate_id, entry)
+        entry[kind] = value
+        return value
+
+
+verification_cache = VerificationCache(
+    max_entries=app.config.get('VERIFICATION_CACHE_SIZE', 2048),
+    ttl=app.config.get('VERIFICATION_CACHE_TTL', 300),
+    negative_ttl=app.config.get('VERIFICATION_CACHE_NEGATIVE_TTL', 30)
+)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_certificates(session, flush_context):
+    changed = session.info.setdefault('verification_cache_changed', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Student):
+            changed.add(obj.certificate_id)
+            # A changed certificate ID leaves its old value cached too
+            changed.update(
+                value for value in db.inspect(obj).attrs.certificate_id.history.deleted if value
+            )
+        elif isinstance(obj, Certificate) and obj.student_id:
+            student = session.identity_map.get(session.identity_key(Student, obj.student_id))
+            if student is not None:
+                changed.add(student.certificate_id)
+            else:
+                changed.add(session.connection().execute(
+                    select(Student.certificate_id).where(Student.id == obj.student_id)
+                ).scalar())
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_certificates(session):
+    for certificate_id in session.info.pop('verification_cache_changed', ()):
+        if certificate_id:
+            verification_cache.invalidate(certificate_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_certificates(session):
+    session.info.pop('verification_cache_changed', None)